@@ -0,0 +1,183 @@
+/*
+ * _ccg4_native - optional C helpers for Claude Code G4's file tools
+ *
+ * Build next to claude_code_g4.py with:
+ *     python3 setup.py build_ext --inplace
+ *
+ * claude_code_g4.py falls back to pure Python when this isn't built.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdio.h>
+#include <string.h>
+
+/* Width of "%6ld" for n */
+static int
+number_width(Py_ssize_t n)
+{
+    int width = 1;
+
+    while (n >= 10) {
+        n /= 10;
+        width++;
+    }
+    return width < 6 ? 6 : width;
+}
+
+/*
+ * format_numbered(lines, start, max_len=2000) -> str
+ *
+ * Same result as
+ *     "".join(f"{i:6d}\t{l[:max_len]}...\n" if len(l) > max_len
+ *             else f"{i:6d}\t{l}" for i, l in enumerate(lines, start))
+ * but sized exactly up front and filled in a single allocation.
+ */
+static PyObject *
+format_numbered(PyObject *self, PyObject *args)
+{
+    PyObject *lines, *seq, *out;
+    Py_ssize_t start, max_len = 2000, count, i, total = 0, pos = 0;
+    Py_UCS4 maxchar = 127;
+    int kind;
+    void *data;
+
+    if (!PyArg_ParseTuple(args, "On|n", &lines, &start, &max_len))
+        return NULL;
+
+    seq = PySequence_Fast(lines, "lines must be a sequence");
+    if (seq == NULL)
+        return NULL;
+    count = PySequence_Fast_GET_SIZE(seq);
+
+    /* First pass: exact output length and widest character */
+    for (i = 0; i < count; i++) {
+        PyObject *line = PySequence_Fast_GET_ITEM(seq, i);
+        Py_ssize_t len;
+        Py_UCS4 mc;
+
+        if (!PyUnicode_Check(line)) {
+            PyErr_SetString(PyExc_TypeError, "lines must contain str");
+            Py_DECREF(seq);
+            return NULL;
+        }
+#if PY_VERSION_HEX < 0x030C0000
+        if (PyUnicode_READY(line) < 0) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+#endif
+        len = PyUnicode_GET_LENGTH(line);
+        total += number_width(start + i) + 1 + (len > max_len ? max_len + 4 : len);
+        mc = PyUnicode_MAX_CHAR_VALUE(line);
+        if (mc > maxchar && len > max_len) {
+            /* Clipped: only the copied prefix counts, or an all-ASCII
+               result could end up in a wider kind than it needs */
+            int lkind = PyUnicode_KIND(line);
+            const void *ldata = PyUnicode_DATA(line);
+            Py_UCS4 limit = mc;
+            Py_ssize_t j;
+
+            mc = 0;
+            for (j = 0; j < max_len && mc < limit; j++) {
+                Py_UCS4 ch = PyUnicode_READ(lkind, ldata, j);
+                if (ch > mc)
+                    mc = ch;
+            }
+        }
+        if (mc > maxchar)
+            maxchar = mc;
+    }
+
+    out = PyUnicode_New(total, maxchar);
+    if (out == NULL) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+    kind = PyUnicode_KIND(out);
+    data = PyUnicode_DATA(out);
+
+    /* Second pass: header digits, tab, then the (possibly clipped) line */
+    for (i = 0; i < count; i++) {
+        PyObject *line = PySequence_Fast_GET_ITEM(seq, i);
+        Py_ssize_t len = PyUnicode_GET_LENGTH(line);
+        Py_ssize_t n = len > max_len ? max_len : len;
+        char num[32];
+        int j, width;
+
+        width = snprintf(num, sizeof(num), "%6ld", (long)(start + i));
+        for (j = 0; j < width; j++)
+            PyUnicode_WRITE(kind, data, pos++, num[j]);
+        PyUnicode_WRITE(kind, data, pos++, '\t');
+
+        if (PyUnicode_CopyCharacters(out, pos, line, 0, n) < 0) {
+            Py_DECREF(out);
+            Py_DECREF(seq);
+            return NULL;
+        }
+        pos += n;
+
+        if (len > max_len) {
+            PyUnicode_WRITE(kind, data, pos++, '.');
+            PyUnicode_WRITE(kind, data, pos++, '.');
+            PyUnicode_WRITE(kind, data, pos++, '.');
+            PyUnicode_WRITE(kind, data, pos++, '\n');
+        }
+    }
+
+    Py_DECREF(seq);
+    return out;
+}
+
+/*
+ * count_newlines(buffer) -> int
+ *
+ * Number of b'\n' bytes in any bytes-like object (bytes, mmap, ...),
+ * counted with memchr and without holding the GIL.
+ */
+static PyObject *
+count_newlines(PyObject *self, PyObject *args)
+{
+    Py_buffer view;
+    const char *p, *end;
+    Py_ssize_t n = 0;
+
+    if (!PyArg_ParseTuple(args, "y*", &view))
+        return NULL;
+
+    Py_BEGIN_ALLOW_THREADS
+    p = (const char *)view.buf;
+    end = p + view.len;
+    while (p < end && (p = memchr(p, '\n', end - p)) != NULL) {
+        n++;
+        p++;
+    }
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    return PyLong_FromSsize_t(n);
+}
+
+static PyMethodDef native_methods[] = {
+    {"format_numbered", format_numbered, METH_VARARGS,
+     "format_numbered(lines, start, max_len=2000) -> str\n\n"
+     "Join lines with right-aligned line numbers, clipping long lines."},
+    {"count_newlines", count_newlines, METH_VARARGS,
+     "count_newlines(buffer) -> int\n\n"
+     "Count newline bytes in a bytes-like object."},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef native_module = {
+    PyModuleDef_HEAD_INIT,
+    "_ccg4_native",
+    "Optional C helpers for Claude Code G4's file tools.",
+    -1,
+    native_methods
+};
+
+PyMODINIT_FUNC
+PyInit__ccg4_native(void)
+{
+    return PyModule_Create(&native_module);
+}
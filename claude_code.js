@@ -52,6 +52,42 @@ Available tools:
 // HTTP Client (via Python)
 // ============================================================================
 
+// Long-lived helper process (http_helper.py --stdio), spoken to with one
+// JSON line per request so its keep-alive connections survive between calls
+let httpHelper = null;
+
+function startHttpHelper() {
+    // Don't let a dead helper's pipe kill us with SIGPIPE
+    os.signal(os.SIGPIPE, undefined);
+
+    const toHelper = os.pipe();
+    const fromHelper = os.pipe();
+    const pid = os.exec([CONFIG.pythonPath, CONFIG.httpHelper, '--stdio'], {
+        block: false,
+        stdin: toHelper[0],
+        stdout: fromHelper[1]
+    });
+    os.close(toHelper[0]);
+    os.close(fromHelper[1]);
+    if (pid < 0) {
+        os.close(toHelper[1]);
+        os.close(fromHelper[0]);
+        return null;
+    }
+    return {
+        pid: pid,
+        input: std.fdopen(toHelper[1], 'w'),
+        output: std.fdopen(fromHelper[0], 'r')
+    };
+}
+
+function stopHttpHelper() {
+    httpHelper.input.close();
+    httpHelper.output.close();
+    os.waitpid(httpHelper.pid, 0);
+    httpHelper = null;
+}
+
 function httpRequest(method, url, headers, body) {
     const req = {
         method: method,
@@ -59,11 +95,31 @@ function httpRequest(method, url, headers, body) {
         headers: headers || {},
         body: body || null
     };
+    const reqJson = JSON.stringify(req);
+
+    // Use the long-lived helper, restarting it once if it has died
+    for (let attempt = 0; attempt < 2; attempt++) {
+        if (!httpHelper) httpHelper = startHttpHelper();
+        if (!httpHelper) break;
+
+        httpHelper.input.puts(reqJson + '\n');
+        httpHelper.input.flush();
+        const line = httpHelper.output.getline();
+        if (line !== null) {
+            try {
+                return JSON.parse(line);
+            } catch (e) {
+                return { ok: false, error: 'Parse error: ' + line };
+            }
+        }
+        stopHttpHelper();
+    }
 
+    // Fall back to a one-shot helper run
     // Write request to temp file
     const tmpFile = '/tmp/qjs_http_' + Date.now() + '.json';
     const f = std.open(tmpFile, 'w');
-    f.puts(JSON.stringify(req));
+    f.puts(reqJson);
     f.close();
 
     // Execute Python HTTP helper
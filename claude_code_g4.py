@@ -22,8 +22,16 @@ import re
 import fnmatch
 import readline
 import hashlib
-from typing import Optional, Dict, List, Any, Generator
+import heapq
+import functools
+import time
+import threading
+import select
+import mmap
+import signal
+from typing import Optional, Dict, List, Any, Callable, Generator
 from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
 # Check Python version
 if sys.version_info < (3, 7):
@@ -31,10 +39,46 @@ if sys.version_info < (3, 7):
     print("On Tiger, use: /opt/local/bin/python3.10")
     sys.exit(1)
 
-# HTTP handling - use urllib (no external deps)
+# HTTP handling - stdlib only (no external deps)
+import http.client
 import urllib.request
 import urllib.error
 import ssl
+from urllib.parse import urlsplit
+
+# JSON: use a C extension if installed (MacPorts py310-orjson / py310-ujson).
+# _dumps returns UTF-8 bytes; _loads accepts bytes or str.
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+
+        def _dumps(obj) -> bytes:
+            return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+        _loads = ujson.loads
+    except ImportError:
+        def _dumps(obj) -> bytes:
+            return json.dumps(obj).encode('utf-8')
+        _loads = json.loads
+
+# Optional C helpers for the file tools (build with: python3 setup.py build_ext --inplace)
+try:
+    from _ccg4_native import format_numbered, count_newlines
+except ImportError:
+    def format_numbered(lines: List[str], start: int, max_len: int = 2000) -> str:
+        """Join lines with right-aligned line numbers, clipping long lines."""
+        return "".join([
+            f"{i:6d}\t{line[:max_len]}...\n" if len(line) > max_len else f"{i:6d}\t{line}"
+            for i, line in enumerate(lines, start)
+        ])
+
+    def count_newlines(buf) -> int:
+        """Count newline bytes in a bytes-like object (bytes, mmap, ...)."""
+        step = 1 << 20
+        return sum(buf[i:i + step].count(b'\n') for i in range(0, len(buf), step))
 
 # Version info
 VERSION = "0.1.0"
@@ -59,6 +103,64 @@ PROXY_URL = os.environ.get("CLAUDE_PROXY", "")
 API_URL = PROXY_URL if PROXY_URL else "https://api.anthropic.com/v1/messages"
 DEFAULT_MODEL = "claude-sonnet-4-20250514"  # Can change to opus, haiku, etc.
 
+# Conversation history budget: past this size, all but the last few messages
+# are folded into a short summary so each turn uploads less
+HISTORY_MAX_BYTES = 32 * 1024
+HISTORY_KEEP_MESSAGES = 8
+HISTORY_SUMMARY_LINES = 40
+SUMMARY_HEADER = "[Summary of earlier conversation]"
+SUPERSEDED_READ = '{"note": "Superseded by a later Read/Write/Edit of this file"}'
+
+# OAuth endpoints
+AUTH_URL = "https://console.anthropic.com/oauth/authorize"
+TOKEN_URL = "https://console.anthropic.com/oauth/token"
+
+# Client ID for Claude Code (public client)
+CLIENT_ID = "9d1c250a-e61b-44cd-8913-9f323a2c5c1b"
+
+CONFIG_DIR = Path.home() / ".config" / "claude-code-g4"
+CACHE_DIR = Path.home() / ".cache" / "claude-code-g4"
+RESPONSE_CACHE_MAX_FILES = 500
+OAUTH_TOKEN_FILE = CONFIG_DIR / "oauth_token.json"
+
+# In-memory copy of the OAuth token record, so the file is parsed once per run
+_oauth_record: Optional[Dict[str, Any]] = None
+
+@functools.lru_cache(maxsize=None)
+def get_ssl_context() -> ssl.SSLContext:
+    """The one SSL context for every HTTPS call (OAuth, token refresh, API).
+
+    Built on first use, so the CA bundle is parsed once per run and not at all
+    when talking to a plain-HTTP proxy. Session tickets stay enabled so a
+    reconnect can resume the TLS session instead of a full handshake.
+    """
+    ctx = ssl.create_default_context()
+    ctx.set_alpn_protocols(["http/1.1"])
+    return ctx
+
+
+class ResumableHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPSConnection that offers a previous TLS session when it connects.
+
+    http.client never resumes sessions on its own; passing the old session
+    to wrap_socket lets a reconnect skip the full handshake.
+    """
+
+    def __init__(self, *args, tls_session: Optional[ssl.SSLSession] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tls_session = tls_session
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        self.sock = self._context.wrap_socket(
+            self.sock, server_hostname=self.host, session=self.tls_session
+        )
+
+    def close(self):
+        if isinstance(self.sock, ssl.SSLSocket):
+            self.tls_session = self.sock.session
+        super().close()
+
 def get_api_key() -> str:
     """Get API key from environment or config file."""
     key = os.environ.get("ANTHROPIC_API_KEY")
@@ -78,27 +180,58 @@ def get_api_key() -> str:
     return ""
 
 
+def load_oauth_record() -> Optional[Dict[str, Any]]:
+    """Load the saved OAuth token record ({access_token, refresh_token, expires_at})."""
+    global _oauth_record
+    if _oauth_record is not None:
+        return _oauth_record
+
+    if OAUTH_TOKEN_FILE.exists():
+        try:
+            _oauth_record = json.loads(OAUTH_TOKEN_FILE.read_text())
+        except ValueError:
+            return None
+    else:
+        # Older versions saved only the bare access token
+        legacy_file = CONFIG_DIR / "oauth_token"
+        if legacy_file.exists():
+            _oauth_record = {"access_token": legacy_file.read_text().strip()}
+    return _oauth_record
+
+
+def save_oauth_record(token_response: Dict[str, Any]) -> Dict[str, Any]:
+    """Persist a token endpoint response atomically and update the in-memory cache."""
+    global _oauth_record
+    record = {
+        "access_token": token_response.get("access_token", ""),
+        "refresh_token": token_response.get("refresh_token")
+            or (_oauth_record or {}).get("refresh_token"),
+        "expires_at": time.time() + token_response["expires_in"]
+            if "expires_in" in token_response else None,
+    }
+
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = OAUTH_TOKEN_FILE.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(record))
+    os.chmod(tmp_file, 0o600)
+    os.replace(tmp_file, OAUTH_TOKEN_FILE)
+
+    _oauth_record = record
+    return record
+
+
 def oauth_login() -> str:
     """Perform OAuth login flow - returns access token."""
     import secrets
-    import time
     import http.server
-    import socketserver
     import threading
     from urllib.parse import urlencode, parse_qs, urlparse
 
-    # OAuth endpoints
-    AUTH_URL = "https://console.anthropic.com/oauth/authorize"
-    TOKEN_URL = "https://console.anthropic.com/oauth/token"
-
-    # Client ID for Claude Code (public client)
-    CLIENT_ID = "9d1c250a-e61b-44cd-8913-9f323a2c5c1b"
-
     # Generate PKCE codes
     code_verifier = secrets.token_urlsafe(64)
     code_challenge = hashlib.sha256(code_verifier.encode()).digest()
     import base64
-    code_challenge = base64.urlsafe_b64encode(code_challenge).decode().rstrip('=')
+    code_challenge = base64.urlsafe_b64encode(code_challenge).rstrip(b'=').decode('ascii')
 
     # State for CSRF protection
     state = secrets.token_urlsafe(32)
@@ -110,7 +243,7 @@ def oauth_login() -> str:
     auth_code = None
     server_error = None
 
-    class OAuthHandler(http.server.SimpleHTTPRequestHandler):
+    class OAuthHandler(http.server.BaseHTTPRequestHandler):
         def do_GET(self):
             nonlocal auth_code, server_error
             parsed = urlparse(self.path)
@@ -160,12 +293,17 @@ def oauth_login() -> str:
     print(f"{Colors.YELLOW}{auth_url}{Colors.RESET}\n")
     print(f"Waiting for authorization... (Ctrl+C to cancel)\n")
 
-    # Start local server to receive callback
+    # Start local server to receive callback (loopback only - no firewall prompt;
+    # HTTPServer sets SO_REUSEADDR so a quick retry can rebind the port)
     try:
-        with socketserver.TCPServer(("", PORT), OAuthHandler) as httpd:
-            httpd.timeout = 300  # 5 minute timeout
+        with http.server.HTTPServer(("127.0.0.1", PORT), OAuthHandler) as httpd:
+            deadline = time.monotonic() + 300  # 5 minute timeout overall
 
             while auth_code is None and server_error is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                httpd.timeout = remaining
                 httpd.handle_request()
 
     except KeyboardInterrupt:
@@ -203,17 +341,13 @@ def oauth_login() -> str:
             method='POST'
         )
 
-        ctx = ssl.create_default_context()
-        with urllib.request.urlopen(req, context=ctx, timeout=30) as response:
+        with urllib.request.urlopen(req, context=get_ssl_context(), timeout=30) as response:
             token_response = json.loads(response.read().decode('utf-8'))
 
         access_token = token_response.get('access_token')
         if access_token:
-            # Save token
-            config_dir = Path.home() / ".config" / "claude-code-g4"
-            config_dir.mkdir(parents=True, exist_ok=True)
-            token_file = config_dir / "oauth_token"
-            token_file.write_text(access_token)
+            # Save full token record (refresh token + expiry) for later refreshes
+            save_oauth_record(token_response)
             print(f"{Colors.GREEN}Login successful! Token saved.{Colors.RESET}\n")
             return access_token
         else:
@@ -233,23 +367,13 @@ def get_auth() -> tuple:
         return api_key, False
 
     # Check for saved OAuth token
-    token_file = Path.home() / ".config" / "claude-code-g4" / "oauth_token"
-    if token_file.exists():
-        return token_file.read_text().strip(), True
+    record = load_oauth_record()
+    if record and record.get("access_token"):
+        return record["access_token"], True
 
     return "", False
 
-def print_banner():
-    """Print startup banner."""
-    print(f"""{Colors.CYAN}
-╔═══════════════════════════════════════════════════════════╗
-║  {Colors.BOLD}Claude Code G4{Colors.RESET}{Colors.CYAN} - AI Coding Assistant for PowerPC      ║
-║  Version {VERSION} "{CODENAME}"                                   ║
-╠═══════════════════════════════════════════════════════════╣
-║  Running on: {get_system_info():<42} ║
-╚═══════════════════════════════════════════════════════════╝
-{Colors.RESET}""")
-
+@functools.lru_cache(maxsize=None)
 def get_system_info() -> str:
     """Get system information string."""
     try:
@@ -258,10 +382,108 @@ def get_system_info() -> str:
     except:
         return "Mac OS X (PowerPC)"
 
+BANNER = f"""{Colors.CYAN}
+╔═══════════════════════════════════════════════════════════╗
+║  {Colors.BOLD}Claude Code G4{Colors.RESET}{Colors.CYAN} - AI Coding Assistant for PowerPC      ║
+║  Version {VERSION} "{CODENAME}"                                   ║
+╠═══════════════════════════════════════════════════════════╣
+║  Running on: {get_system_info():<42} ║
+╚═══════════════════════════════════════════════════════════╝
+{Colors.RESET}"""
+
+def print_banner():
+    """Print startup banner."""
+    print(BANNER)
+
 # =============================================================================
 # Tool Implementations
 # =============================================================================
 
+# Regex syntax `grep -E` doesn't share with Python: any backslash escape other
+# than \w \W \b \B and escaped ASCII punctuation (\d, \t, \x09, \A, \u00e9,
+# a trailing backslash, ...), lazy quantifiers and (?...) groups. \< \> \' and
+# \` are punctuation but GNU grep anchors (word and buffer boundaries). grep
+# would silently match these differently, so they go to the Python scan.
+_PYTHON_ONLY_RE = re.compile(r'\\(?![wWbB!-&(-/:;=?@\[-_{-~])|[*+?}]\?|\(\?')
+
+# Files above this size are memory-mapped by Read/Edit instead of decoded whole
+MMAP_THRESHOLD = 1 << 20
+
+# Directories never worth searching (VCS metadata, dependencies, caches)
+SKIP_DIRS = frozenset({'.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv'})
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_re(pattern: str) -> "re.Pattern":
+    """Compile a grep pattern, reusing it across repeated searches."""
+    return re.compile(pattern)
+
+
+@functools.lru_cache(maxsize=None)
+def _grep_has_exclude_dir() -> bool:
+    """Whether system grep takes --exclude-dir (Tiger's grep 2.5.1 doesn't)."""
+    try:
+        # No match exits 1; an unknown option exits 2
+        return subprocess.call(
+            ["grep", "--exclude-dir=x", "-e", "x", os.devnull],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 1
+    except OSError:
+        return False
+
+
+def _glob_to_re(pattern: str) -> "re.Pattern":
+    """Translate a pathlib-style glob (with ** for any depth) to a regex on
+    '/'-separated relative paths. Directories are also tried with a trailing
+    '/', which is what a trailing ** requires (it matches directories only)."""
+    parts = []
+    segments = pattern.strip("/").split("/")
+    for n, segment in enumerate(segments):
+        last = n == len(segments) - 1
+        if segment == "**":
+            parts.append("(?:[^/]+/)*")
+            continue
+        parts.append("(?=[^/])")  # names are never empty
+        i = 0
+        while i < len(segment):
+            c = segment[i]
+            if c == "*":
+                parts.append("[^/]*")
+            elif c == "?":
+                parts.append("[^/]")
+            elif c == "[" and segment.find("]", i + 2) > 0:
+                j = segment.find("]", i + 2)
+                body = segment[i + 1:j]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append("[" + body.replace("\\", "\\\\") + "]")
+                i = j
+            else:
+                parts.append(re.escape(c))
+            i += 1
+        if not last:
+            parts.append("/")
+    return re.compile("".join(parts) + r"\Z", re.DOTALL)
+
+
+def _normalize_glob(base: Path, pattern: str) -> "tuple[Path, str]":
+    """Drop '.' segments from a glob and resolve '..' against the literal
+    segment before it (or against base, for leading ones). A '..' after a
+    wildcard segment has no single parent, so it's rejected."""
+    segments: List[str] = []
+    for segment in pattern.split("/"):
+        if segment in ("", "."):
+            continue
+        if segment != "..":
+            segments.append(segment)
+        elif not segments:
+            base = base.parent
+        elif any(c in segments[-1] for c in "*?["):
+            raise ValueError(f"'..' after a wildcard in glob: {pattern}")
+        else:
+            segments.pop()
+    return base, "/".join(segments)
+
+
 class Tools:
     """Tool implementations matching Claude Code's tools."""
 
@@ -275,22 +497,21 @@ class Tools:
             if path.is_dir():
                 return {"error": f"Path is a directory: {file_path}"}
 
-            with open(path, 'r', encoding='utf-8', errors='replace') as f:
-                lines = f.readlines()
-
-            # Apply offset and limit
-            total_lines = len(lines)
             start = max(0, offset)
-            end = min(total_lines, start + limit)
-            selected = lines[start:end]
+            if path.stat().st_size > MMAP_THRESHOLD:
+                # Large file: decode only the requested slice
+                selected, total_lines = Tools._read_lines_mmap(path, start, limit)
+            else:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    lines = f.readlines()
 
-            # Format with line numbers
-            content = ""
-            for i, line in enumerate(selected, start=start+1):
-                # Truncate long lines
-                if len(line) > 2000:
-                    line = line[:2000] + "...\n"
-                content += f"{i:6d}\t{line}"
+                # Apply offset and limit
+                total_lines = len(lines)
+                end = min(total_lines, start + limit)
+                selected = lines[start:end]
+
+            # Format with line numbers (long lines truncated)
+            content = format_numbered(selected, start + 1)
 
             return {
                 "content": content,
@@ -301,6 +522,42 @@ class Tools:
         except Exception as e:
             return {"error": str(e)}
 
+    @staticmethod
+    def _read_lines_mmap(path: Path, start: int, limit: int) -> tuple:
+        """Return (lines[start:start+limit], total_lines) for a large file.
+
+        The file is memory-mapped and scanned for newlines, so only the
+        requested lines are decoded into Python strings.
+        """
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            pos = 0
+            for _ in range(start):
+                nl = mm.find(b'\n', pos)
+                if nl < 0:
+                    pos = size
+                    break
+                pos = nl + 1
+            end = pos
+            for _ in range(limit):
+                nl = mm.find(b'\n', end)
+                if nl < 0:
+                    end = size
+                    break
+                end = nl + 1
+            text = mm[pos:end].decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+            total_lines = count_newlines(mm)
+            if size and mm[size - 1] != ord('\n'):
+                total_lines += 1
+
+        lines = text.split('\n')
+        tail = lines.pop()
+        lines = [line + '\n' for line in lines]
+        if tail:
+            lines.append(tail)
+        return lines, total_lines
+
     @staticmethod
     def write_file(file_path: str, content: str) -> Dict[str, Any]:
         """Write content to a file."""
@@ -323,16 +580,25 @@ class Tools:
             if not path.exists():
                 return {"error": f"File not found: {file_path}"}
 
+            # Large file: reject a missing old_string from the raw bytes before
+            # decoding. Only valid without newlines, which text mode translates.
+            if path.stat().st_size > MMAP_THRESHOLD and not ('\n' in old_string or '\r' in old_string):
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if mm.find(old_string.encode('utf-8')) < 0:
+                        return {"error": f"String not found in file"}
+
             content = path.read_text(encoding='utf-8')
 
-            # Check if old_string exists
-            count = content.count(old_string)
-            if count == 0:
+            # Check old_string exists exactly once - one scan in the common case
+            idx = content.find(old_string)
+            if idx < 0:
                 return {"error": f"String not found in file"}
-            if count > 1:
+            end = idx + len(old_string)
+            if content.find(old_string, end) >= 0:
+                count = content.count(old_string)
                 return {"error": f"String found {count} times - must be unique"}
 
-            new_content = content.replace(old_string, new_string, 1)
+            new_content = content[:idx] + new_string + content[end:]
             path.write_text(new_content, encoding='utf-8')
 
             return {"success": True, "path": str(path)}
@@ -342,27 +608,55 @@ class Tools:
     @staticmethod
     def bash(command: str, timeout: int = 120) -> Dict[str, Any]:
         """Execute a bash command."""
+        limit = 30000  # characters of output returned to Claude
         try:
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 command,
                 shell=True,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                cwd=os.getcwd()
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=os.getcwd(),
+                start_new_session=True  # so a timeout can kill the whole pipeline
             )
 
-            output = result.stdout
-            if result.stderr:
-                output += "\n" + result.stderr
+            # Read incrementally, keeping at most ~limit bytes; anything past
+            # that is drained and dropped so the command still runs to completion
+            fd = proc.stdout.fileno()
+            buf = bytearray()
+            dropped = False
+            deadline = time.monotonic() + timeout
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(command, timeout)
+                    ready, _, _ = select.select([fd], [], [], remaining)
+                    if not ready:
+                        continue
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        break
+                    if len(buf) < limit:
+                        buf += chunk
+                    else:
+                        dropped = True
+                returncode = proc.wait(timeout=max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+                raise
+            finally:
+                proc.stdout.close()
+
+            output = buf.decode('utf-8', errors='replace')
 
             # Truncate if too long
-            if len(output) > 30000:
-                output = output[:30000] + "\n... (truncated)"
+            if dropped or len(output) > limit:
+                output = output[:limit] + "\n... (truncated)"
 
             return {
                 "output": output,
-                "exit_code": result.returncode
+                "exit_code": returncode
             }
         except subprocess.TimeoutExpired:
             return {"error": f"Command timed out after {timeout}s"}
@@ -373,153 +667,404 @@ class Tools:
     def glob_files(pattern: str, path: str = ".") -> Dict[str, Any]:
         """Find files matching a glob pattern."""
         try:
-            base = Path(path).expanduser().resolve()
-            matches = list(base.glob(pattern))
-
-            # Sort by modification time (newest first)
-            matches.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-
-            # Limit results
-            matches = matches[:100]
+            base, pattern = _normalize_glob(Path(path).expanduser().resolve(), pattern)
+            regex = _glob_to_re(pattern)
+            # Without "**" the pattern can't match deeper than its own segments
+            max_depth = None if "**" in pattern else pattern.count("/")
+
+            # Newest 100 by modification time, without sorting every match
+            matches = heapq.nlargest(
+                100,
+                Tools._iter_scan(str(base), regex, max_depth),
+                key=lambda m: m[1]
+            )
 
             return {
-                "files": [str(p) for p in matches],
+                "files": [p for p, _ in matches],
                 "count": len(matches)
             }
         except Exception as e:
             return {"error": str(e)}
 
+    @staticmethod
+    def _iter_scan(base: str, regex: "re.Pattern", max_depth: Optional[int]):
+        """Walk base with os.scandir, yielding (path, mtime_ns) for matching entries."""
+        stack = [("", base, 0)]
+        while stack:
+            rel_dir, dir_path, depth = stack.pop()
+            try:
+                entries = os.scandir(dir_path)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    rel_path = rel_dir + entry.name
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if regex.match(rel_path) or (is_dir and regex.match(rel_path + "/")):
+                            yield entry.path, entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+                    if is_dir and (max_depth is None or depth < max_depth):
+                        stack.append((rel_path + "/", entry.path, depth + 1))
+
     @staticmethod
     def grep(pattern: str, path: str = ".", file_pattern: str = "*") -> Dict[str, Any]:
         """Search for pattern in files."""
         try:
             base = Path(path).expanduser().resolve()
-            results = []
-            regex = re.compile(pattern)
 
-            # Find matching files
-            if base.is_file():
-                files = [base]
+            # Prefer the system grep (native code); Python-only regex syntax
+            # or a missing/failed grep falls back to the pure-Python scan.
+            if not _PYTHON_ONLY_RE.search(pattern):
+                results = Tools._grep_native(pattern, base, file_pattern)
+                if results is not None:
+                    return {"matches": results, "count": len(results)}
+
+            results = Tools._grep_python(pattern, base, file_pattern)
+            return {"matches": results, "count": len(results)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _grep_native(pattern: str, base: Path, file_pattern: str) -> Optional[List[Dict]]:
+        """Run system `grep -nE`; returns None if grep is unavailable or errors."""
+        cmd = ["grep", "-nHE", "--binary-files=without-match"]
+        prefix = None
+        if not base.is_file():
+            cmd += ["-r", "--include", file_pattern]
+            if _grep_has_exclude_dir():
+                cmd += [f"--exclude-dir={d}" for d in sorted(SKIP_DIRS)]
             else:
-                files = list(base.rglob(file_pattern))[:1000]
+                # Old grep: drop matches under SKIP_DIRS as they come back
+                prefix = len(str(base).rstrip(os.sep)) + 1
+        cmd += ["-e", pattern, str(base)]
 
-            for file_path in files:
-                if not file_path.is_file():
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                errors='replace'
+            )
+        except FileNotFoundError:
+            return None
+
+        timer = threading.Timer(30, proc.kill)
+        timer.start()
+        results = []
+        try:
+            for line in proc.stdout:
+                parts = line.split(":", 2)
+                if len(parts) < 3 or not parts[1].isdigit():
                     continue
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        for i, line in enumerate(f, 1):
-                            if regex.search(line):
-                                results.append({
-                                    "file": str(file_path),
-                                    "line": i,
-                                    "content": line.rstrip()[:200]
-                                })
-                                if len(results) >= 100:
-                                    break
-                except:
+                if prefix and not SKIP_DIRS.isdisjoint(parts[0][prefix:].split(os.sep)[:-1]):
                     continue
-
+                results.append({
+                    "file": parts[0],
+                    "line": int(parts[1]),
+                    "content": parts[2].rstrip()[:200]
+                })
                 if len(results) >= 100:
+                    # Enough matches - don't make grep scan the rest of the tree
+                    proc.kill()
                     break
+        finally:
+            timer.cancel()
+            proc.stdout.close()
+            returncode = proc.wait()
 
-            return {"matches": results, "count": len(results)}
-        except Exception as e:
-            return {"error": str(e)}
+        # Exit status 2 means grep itself failed (e.g. bad regex)
+        if returncode == 2 and not results:
+            return None
+        return results
+
+    @staticmethod
+    def _iter_grep_files(base: Path, file_pattern: str, max_files: int = 1000):
+        """Lazily yield up to max_files paths to search, pruning SKIP_DIRS."""
+        if base.is_file():
+            yield str(base)
+            return
+
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+            for fn in filenames:
+                if fnmatch.fnmatch(fn, file_pattern):
+                    yield os.path.join(dirpath, fn)
+                    count += 1
+                    if count >= max_files:
+                        return
+
+    @staticmethod
+    def _grep_python(pattern: str, base: Path, file_pattern: str) -> List[Dict]:
+        """Pure-Python fallback for Tools.grep."""
+        results = []
+        search = _compile_re(pattern).search  # bound once, outside the hot loop
+
+        for file_path in Tools._iter_grep_files(base, file_pattern):
+            try:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    for i, line in enumerate(f, 1):
+                        if search(line):
+                            results.append({
+                                "file": file_path,
+                                "line": i,
+                                "content": line.rstrip()[:200]
+                            })
+                            if len(results) >= 100:
+                                break
+            except:
+                continue
+
+            if len(results) >= 100:
+                break
+
+        return results
 
 # =============================================================================
 # Claude API Client
 # =============================================================================
 
+def _purge_response_cache():
+    """Trim the response cache to its newest RESPONSE_CACHE_MAX_FILES entries
+    by access time."""
+    try:
+        entries = [
+            entry
+            for bucket in os.scandir(CACHE_DIR) if bucket.is_dir()
+            for entry in os.scandir(bucket.path) if entry.name.endswith(".json")
+        ]
+    except OSError:
+        return
+    if len(entries) <= RESPONSE_CACHE_MAX_FILES:
+        return
+    entries.sort(key=lambda e: e.stat().st_atime, reverse=True)
+    for entry in entries[RESPONSE_CACHE_MAX_FILES:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _shorten(text: str, width: int = 150) -> str:
+    """Collapse whitespace and clip text for the history summary."""
+    text = " ".join(text.split())
+    return text if len(text) <= width else text[:width] + "..."
+
+
+def _is_tool_results(message: Dict) -> bool:
+    """True for the synthetic user messages that carry tool_result blocks."""
+    content = message["content"]
+    return isinstance(content, list) and any(
+        block.get("type") == "tool_result" for block in content
+    )
+
+
+def _summarize_message(message: Dict) -> List[str]:
+    """One-line-per-block digest of a message for the history summary."""
+    role = message["role"].capitalize()
+    content = message["content"]
+    if isinstance(content, str):
+        return [f"{role}: {_shorten(content)}"]
+
+    lines = []
+    for block in content:
+        if block.get("type") == "text":
+            text = block["text"]
+            if text.startswith(SUMMARY_HEADER):
+                # Carry an earlier summary forward as-is
+                lines.extend(text[len(SUMMARY_HEADER):].strip().splitlines())
+            elif text.strip():
+                lines.append(f"{role}: {_shorten(text)}")
+        elif block.get("type") == "tool_use":
+            args = block["input"].get("file_path") or block["input"].get("command") \
+                or block["input"].get("pattern", "")
+            lines.append(f"{role} used {block['name']}({_shorten(str(args), 80)})")
+    return lines
+
+
+# Tools available to Claude. The schema never changes, so it is serialized
+# once here instead of on every request.
+TOOLS: List[Dict] = [
+    {
+        "name": "Read",
+        "description": "Read a file from the filesystem",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string", "description": "Absolute path to file"},
+                "offset": {"type": "integer", "description": "Line offset (default 0)"},
+                "limit": {"type": "integer", "description": "Max lines (default 2000)"}
+            },
+            "required": ["file_path"]
+        }
+    },
+    {
+        "name": "Write",
+        "description": "Write content to a file",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string", "description": "Absolute path to file"},
+                "content": {"type": "string", "description": "Content to write"}
+            },
+            "required": ["file_path", "content"]
+        }
+    },
+    {
+        "name": "Edit",
+        "description": "Replace a unique string in a file",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string", "description": "Absolute path to file"},
+                "old_string": {"type": "string", "description": "String to replace"},
+                "new_string": {"type": "string", "description": "Replacement string"}
+            },
+            "required": ["file_path", "old_string", "new_string"]
+        }
+    },
+    {
+        "name": "Bash",
+        "description": "Execute a bash command",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "command": {"type": "string", "description": "Command to execute"},
+                "timeout": {"type": "integer", "description": "Timeout in seconds"}
+            },
+            "required": ["command"]
+        }
+    },
+    {
+        "name": "Glob",
+        "description": "Find files matching a pattern",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "pattern": {"type": "string", "description": "Glob pattern"},
+                "path": {"type": "string", "description": "Base path (default .)"}
+            },
+            "required": ["pattern"]
+        }
+    },
+    {
+        "name": "Grep",
+        "description": "Search for pattern in files",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "pattern": {"type": "string", "description": "Regex pattern"},
+                "path": {"type": "string", "description": "Path to search"},
+                "file_pattern": {"type": "string", "description": "File glob pattern"}
+            },
+            "required": ["pattern"]
+        }
+    }
+]
+
+_TOOLS_JSON = _dumps(TOOLS)
+
+# Tools with no side effects, safe to run concurrently with each other.
+# Write, Edit and Bash run one at a time, in the order Claude asked for them.
+READ_ONLY_TOOLS = frozenset({"Read", "Glob", "Grep"})
+
+
 class ClaudeClient:
     """Client for Claude API with tool use support."""
 
-    def __init__(self, api_key: str, model: str = DEFAULT_MODEL, is_oauth: bool = False):
+    def __init__(self, api_key: str, model: str = DEFAULT_MODEL, is_oauth: bool = False,
+                 use_cache: bool = True):
         self.api_key = api_key
         self.model = model
         self.is_oauth = is_oauth
+        self.use_cache = use_cache
         self.conversation: List[Dict] = []
-        self.tools = self._define_tools()
-
-    def _define_tools(self) -> List[Dict]:
-        """Define available tools for Claude."""
-        return [
-            {
-                "name": "Read",
-                "description": "Read a file from the filesystem",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {"type": "string", "description": "Absolute path to file"},
-                        "offset": {"type": "integer", "description": "Line offset (default 0)"},
-                        "limit": {"type": "integer", "description": "Max lines (default 2000)"}
-                    },
-                    "required": ["file_path"]
-                }
-            },
-            {
-                "name": "Write",
-                "description": "Write content to a file",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {"type": "string", "description": "Absolute path to file"},
-                        "content": {"type": "string", "description": "Content to write"}
-                    },
-                    "required": ["file_path", "content"]
-                }
-            },
-            {
-                "name": "Edit",
-                "description": "Replace a unique string in a file",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {"type": "string", "description": "Absolute path to file"},
-                        "old_string": {"type": "string", "description": "String to replace"},
-                        "new_string": {"type": "string", "description": "Replacement string"}
-                    },
-                    "required": ["file_path", "old_string", "new_string"]
-                }
-            },
-            {
-                "name": "Bash",
-                "description": "Execute a bash command",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "command": {"type": "string", "description": "Command to execute"},
-                        "timeout": {"type": "integer", "description": "Timeout in seconds"}
-                    },
-                    "required": ["command"]
-                }
-            },
-            {
-                "name": "Glob",
-                "description": "Find files matching a pattern",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "pattern": {"type": "string", "description": "Glob pattern"},
-                        "path": {"type": "string", "description": "Base path (default .)"}
-                    },
-                    "required": ["pattern"]
-                }
-            },
-            {
-                "name": "Grep",
-                "description": "Search for pattern in files",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "pattern": {"type": "string", "description": "Regex pattern"},
-                        "path": {"type": "string", "description": "Path to search"},
-                        "file_pattern": {"type": "string", "description": "File glob pattern"}
-                    },
-                    "required": ["pattern"]
-                }
-            }
-        ]
+
+        # One keep-alive connection for the whole session, so tool-use
+        # round-trips don't pay a fresh TLS handshake each time.
+        url = urlsplit(API_URL)
+        self._scheme = url.scheme
+        self._host = url.hostname
+        self._port = url.port
+        self._path = url.path or "/v1/messages"
+        self._conn = None
+        self._tls_session = None  # carried across reconnects for resumption
+
+        # Read-only tool calls in one turn (Read/Glob/Grep) run concurrently
+        self._tool_pool = ThreadPoolExecutor(max_workers=4)
+
+        if use_cache:
+            _purge_response_cache()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        """Open the persistent API connection."""
+        if self._scheme == "https":
+            self._conn = ResumableHTTPSConnection(
+                self._host, self._port, context=get_ssl_context(), timeout=120,
+                tls_session=self._tls_session
+            )
+        else:
+            self._conn = http.client.HTTPConnection(self._host, self._port, timeout=120)
+        return self._conn
+
+    def _refresh_if_needed(self):
+        """Refresh the OAuth access token shortly before it expires."""
+        if not self.is_oauth or PROXY_URL:
+            return
+        record = load_oauth_record()
+        if not record or not record.get("refresh_token") or not record.get("expires_at"):
+            return
+        if record["expires_at"] - time.time() >= 60:
+            return
+
+        from urllib.parse import urlencode
+        body = urlencode({
+            'grant_type': 'refresh_token',
+            'client_id': CLIENT_ID,
+            'refresh_token': record["refresh_token"],
+        })
+        token_url = urlsplit(TOKEN_URL)
+        conn = http.client.HTTPSConnection(token_url.hostname, context=get_ssl_context(), timeout=30)
+        try:
+            conn.request("POST", token_url.path, body,
+                         {'Content-Type': 'application/x-www-form-urlencoded'})
+            response = conn.getresponse()
+            token_response = json.loads(response.read().decode('utf-8'))
+        finally:
+            conn.close()
+
+        if response.status == 200 and token_response.get("access_token"):
+            self.api_key = save_oauth_record(token_response)["access_token"]
+
+    def _drop_connection(self):
+        """Close the persistent connection, keeping its TLS session so the
+        next _connect() can resume it."""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+            self._tls_session = getattr(conn, "tls_session", None)
+
+    def _post(self, body: bytes, headers: Dict[str, str]) -> http.client.HTTPResponse:
+        """POST to the API over the persistent connection, reconnecting once if stale."""
+        for attempt in (0, 1):
+            conn = self._conn or self._connect()
+            try:
+                conn.request("POST", self._path, body, headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                    http.client.ImproperConnectionState,
+                    ConnectionResetError, BrokenPipeError):
+                # Server dropped an idle keep-alive socket (or a previous reply
+                # was left unread) - retry once on a fresh one
+                self._drop_connection()
+                if attempt:
+                    raise
+            except Exception:
+                self._drop_connection()
+                raise
 
     def _execute_tool(self, name: str, input_data: Dict) -> str:
         """Execute a tool and return result as JSON string."""
@@ -560,14 +1105,238 @@ class ClaudeClient:
 
         return json.dumps(result)
 
+    def _read_response(self, response: http.client.HTTPResponse,
+                       on_tool_use: Optional[Callable[[Dict], None]] = None
+                       ) -> Generator[str, None, tuple]:
+        """Yield text from an API response as it arrives.
+
+        Parses the SSE stream frame by frame; plain JSON replies (e.g. from the
+        proxies) are handled too. on_tool_use is called with each tool_use
+        block as soon as it is complete, so the tool can start running while
+        the rest of the response streams in. Returns (stop_reason, content_blocks).
+        """
+        content_type = response.getheader("Content-Type", "")
+        if not content_type.startswith("text/event-stream"):
+            response_data = _loads(response.read())
+            content_blocks = response_data.get("content", [])
+            for block in content_blocks:
+                if block["type"] == "text":
+                    yield block["text"]
+                elif block["type"] == "tool_use" and on_tool_use:
+                    on_tool_use(block)
+            return response_data.get("stop_reason"), content_blocks
+
+        stop_reason = None
+        content_blocks: List[Dict] = []
+        tool_json: Dict[int, List[str]] = {}  # partial tool input, by block index
+
+        for raw in response:
+            if not raw.startswith(b"data: "):
+                continue
+            event = _loads(raw[6:])
+            event_type = event.get("type")
+
+            if event_type == "content_block_start":
+                block = event["content_block"]
+                content_blocks.append(block)
+                if block["type"] == "tool_use":
+                    tool_json[event["index"]] = []
+            elif event_type == "content_block_delta":
+                delta = event["delta"]
+                if delta["type"] == "text_delta":
+                    content_blocks[event["index"]]["text"] += delta["text"]
+                    yield delta["text"]
+                elif delta["type"] == "input_json_delta":
+                    tool_json[event["index"]].append(delta["partial_json"])
+            elif event_type == "content_block_stop":
+                parts = tool_json.pop(event["index"], None)
+                if parts is not None:
+                    block = content_blocks[event["index"]]
+                    block["input"] = _loads("".join(parts) or "{}")
+                    if on_tool_use:
+                        on_tool_use(block)
+            elif event_type == "message_delta":
+                stop_reason = event["delta"].get("stop_reason", stop_reason)
+            elif event_type == "message_stop":
+                break
+            elif event_type == "error":
+                raise RuntimeError(event["error"].get("message", "stream error"))
+
+        # Drain the rest so the keep-alive connection can be reused
+        response.read()
+        return stop_reason, content_blocks
+
+    def _drop_superseded_reads(self):
+        """Stub out Read results made stale by a later Write/Edit (or an
+        identical Read) of the same file."""
+        tool_calls = {}
+        for message in self.conversation:
+            if message["role"] == "assistant" and isinstance(message["content"], list):
+                for block in message["content"]:
+                    if block.get("type") == "tool_use" and "file_path" in block["input"]:
+                        tool_calls[block["id"]] = block
+
+        last_reads: Dict[str, tuple] = {}  # file_path -> (Read input, tool_result block)
+        for message in self.conversation:
+            if not _is_tool_results(message):
+                continue
+            for block in message["content"]:
+                call = tool_calls.get(block.get("tool_use_id"))
+                if call is None:
+                    continue
+                file_path = call["input"]["file_path"]
+                previous = last_reads.get(file_path)
+                if previous and (call["name"] != "Read" or call["input"] == previous[0]):
+                    previous[1]["content"] = SUPERSEDED_READ
+                    del last_reads[file_path]
+                if call["name"] == "Read":
+                    last_reads[file_path] = (call["input"], block)
+
+    def _trim_history(self):
+        """Keep the per-turn upload bounded on long sessions.
+
+        Once the history is larger than HISTORY_MAX_BYTES, everything before
+        the last HISTORY_KEEP_MESSAGES messages is folded into a summary block
+        on the first kept user message. The cut is made at a plain user
+        message, or failing that (one prompt followed by a long tool loop)
+        just before an assistant message, with the summary as a new user
+        message ahead of it. Either way tool_use/tool_result pairs are never
+        split.
+
+        Read results made stale by a later Write/Edit are stubbed out first,
+        and only once over budget: until then Claude keeps the full text of
+        a file it's in the middle of editing.
+        """
+        if len(_dumps(self.conversation)) <= HISTORY_MAX_BYTES:
+            return
+        self._drop_superseded_reads()
+        if len(_dumps(self.conversation)) <= HISTORY_MAX_BYTES:
+            return
+
+        cut = 0
+        for i in range(len(self.conversation) - HISTORY_KEEP_MESSAGES, 0, -1):
+            message = self.conversation[i]
+            if message["role"] == "user" and not _is_tool_results(message):
+                cut = i
+                break
+            if not cut and message["role"] == "assistant":
+                cut = i  # fallback, unless a plain user message turns up
+        if not cut:
+            return
+
+        lines = []
+        for message in self.conversation[:cut]:
+            lines.extend(_summarize_message(message))
+        if len(lines) > HISTORY_SUMMARY_LINES:
+            # The first line is always the user's original prompt (carried
+            # forward by earlier summaries), so it survives every trim
+            lines = lines[:1] + lines[-(HISTORY_SUMMARY_LINES - 1):]
+        summary = [{"type": "text", "text": SUMMARY_HEADER + "\n" + "\n".join(lines)}]
+
+        first = self.conversation[cut]
+        if first["role"] == "assistant":
+            self.conversation = [{"role": "user", "content": summary}] + self.conversation[cut:]
+            return
+        content = first["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        self.conversation = [
+            {"role": "user", "content": summary + content}
+        ] + self.conversation[cut + 1:]
+
+    def _request_bytes(self, system_prompt: str) -> bytes:
+        """Encode the request body around the pre-serialized tool schemas."""
+        return b"".join((
+            b'{"model":', _dumps(self.model),
+            b',"max_tokens":4096,"stream":true,"system":', _dumps(system_prompt),
+            b',"tools":', _TOOLS_JSON,
+            b',"messages":', _dumps(self.conversation),
+            b'}'
+        ))
+
+    def _cache_path(self, body: bytes) -> Path:
+        """Location of the cached response for a request body."""
+        key = hashlib.sha256(body).hexdigest()
+        return CACHE_DIR / key[:2] / f"{key}.json"
+
+    def _cache_get(self, body: bytes) -> Optional[Dict]:
+        """Return the cached {stop_reason, content} for a request, if any."""
+        if not self.use_cache:
+            return None
+        path = self._cache_path(body)
+        try:
+            cached = _loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used for the purge
+        return cached
+
+    def _cache_put(self, body: bytes, stop_reason: Optional[str], content_blocks: List[Dict]):
+        """Cache a final (non tool-use) response for a request."""
+        if not self.use_cache or stop_reason == "tool_use":
+            return
+        path = self._cache_path(body)
+        try:
+            # Replies can quote private code, so keep them owner-only
+            CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            path.parent.mkdir(mode=0o700, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "wb") as f:
+                f.write(_dumps({"stop_reason": stop_reason, "content": content_blocks}))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _exchange(self, system_prompt: str, headers: Dict[str, str],
+                  on_tool_use: Callable[[Dict], None]) -> Generator[str, None, Optional[tuple]]:
+        """Send the conversation and yield the reply text as it arrives.
+
+        Returns (stop_reason, content_blocks), or None after yielding an API
+        error. Identical requests are answered from the on-disk cache.
+        """
+        body = self._request_bytes(system_prompt)
+
+        cached = self._cache_get(body)
+        if cached is not None:
+            print(f"{Colors.DIM}  (cached response){Colors.RESET}", flush=True)
+            for block in cached["content"]:
+                if block["type"] == "text":
+                    yield block["text"]
+            return cached["stop_reason"], cached["content"]
+
+        response = self._post(body, headers)
+
+        if response.status != 200:
+            error_body = response.read().decode('utf-8')
+            yield f"{Colors.RED}API Error: {response.status} - {error_body}{Colors.RESET}"
+            return None
+
+        # Text is yielded as it streams in
+        try:
+            stop_reason, content_blocks = yield from self._read_response(response, on_tool_use)
+        finally:
+            # Cut short (stream error, or the caller closed us on Ctrl+C):
+            # the rest of the reply is still on the socket, so the
+            # connection can't carry another request
+            if not response.isclosed():
+                self._drop_connection()
+        self._cache_put(body, stop_reason, content_blocks)
+        return stop_reason, content_blocks
+
     def send_message(self, user_message: str) -> Generator[str, None, None]:
         """Send a message and yield response chunks."""
+        try:
+            self._refresh_if_needed()
+        except Exception as e:
+            print(f"{Colors.YELLOW}  Token refresh failed: {e}{Colors.RESET}")
 
         # Add user message to conversation
         self.conversation.append({
             "role": "user",
             "content": user_message
         })
+        self._trim_history()
 
         # Build request
         system_prompt = f"""You are Claude Code G4, an AI coding assistant running on a vintage PowerPC G4 Mac.
@@ -579,14 +1348,6 @@ You have access to tools for reading, writing, and editing files, running bash c
 Be concise and efficient - this is a resource-constrained system.
 When using tools, wait for results before continuing."""
 
-        request_data = {
-            "model": self.model,
-            "max_tokens": 4096,
-            "system": system_prompt,
-            "messages": self.conversation,
-            "tools": self.tools
-        }
-
         # Make API request
         headers = {
             "Content-Type": "application/json",
@@ -600,37 +1361,40 @@ When using tools, wait for results before continuing."""
             else:
                 headers["x-api-key"] = self.api_key
 
-        try:
-            print(f"{Colors.DIM}  Connecting to API...{Colors.RESET}", flush=True)
-            req = urllib.request.Request(
-                API_URL,
-                data=json.dumps(request_data).encode('utf-8'),
-                headers=headers,
-                method='POST'
-            )
-
-            # Create SSL context
-            ctx = ssl.create_default_context()
+        # Tools already running, started from the stream, keyed by tool_use id.
+        # Only read-only tools ahead of the reply's first mutating tool start
+        # early: later ones must see its effects, and Write/Edit/Bash must not
+        # run at all if the stream then fails and the turn is dropped.
+        started_tools: Dict[str, Future] = {}
+        mutating_seen = False
+
+        def start_tool(block: Dict):
+            nonlocal mutating_seen
+            if block["name"] not in READ_ONLY_TOOLS:
+                mutating_seen = True
+            elif not mutating_seen:
+                started_tools[block["id"]] = self._tool_pool.submit(
+                    self._execute_tool, block["name"], block["input"]
+                )
 
+        try:
             print(f"{Colors.DIM}  Sending request...{Colors.RESET}", flush=True)
-            with urllib.request.urlopen(req, context=ctx, timeout=120) as response:
-                print(f"{Colors.DIM}  Reading response...{Colors.RESET}", flush=True)
-                response_text = response.read().decode('utf-8')
-
-            response_data = json.loads(response_text)
-            print(f"{Colors.DIM}  Got response!{Colors.RESET}", flush=True)
+            result = yield from self._exchange(system_prompt, headers, start_tool)
+            if result is None:
+                return
+            stop_reason, content_blocks = result
 
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8')
-            yield f"{Colors.RED}API Error: {e.code} - {error_body}{Colors.RESET}"
-            return
         except Exception as e:
             yield f"{Colors.RED}Error: {e}{Colors.RESET}"
             return
 
-        # Process response
-        stop_reason = response_data.get("stop_reason")
-        content_blocks = response_data.get("content", [])
+        # Fast path: most turns are plain text (already yielded while streaming)
+        if stop_reason != "tool_use":
+            self.conversation.append({
+                "role": "assistant",
+                "content": content_blocks
+            })
+            return
 
         # Handle tool use
         while stop_reason == "tool_use":
@@ -640,7 +1404,6 @@ When using tools, wait for results before continuing."""
 
             for block in content_blocks:
                 if block["type"] == "text":
-                    yield block["text"]
                     assistant_content.append(block)
                 elif block["type"] == "tool_use":
                     tool_uses.append(block)
@@ -652,14 +1415,25 @@ When using tools, wait for results before continuing."""
                 "content": assistant_content
             })
 
-            # Execute tools and collect results
-            tool_results = []
+            # Read-only tools run concurrently (some were started as their
+            # blocks streamed in). Each mutating tool is a barrier: it waits
+            # for every earlier tool, and later ones start after it.
+            outputs = []  # Future or result string, in request order
             for tool_use in tool_uses:
-                result = self._execute_tool(tool_use["name"], tool_use["input"])
+                if tool_use["name"] in READ_ONLY_TOOLS:
+                    outputs.append(started_tools.pop(tool_use["id"], None)
+                                   or self._tool_pool.submit(
+                                       self._execute_tool, tool_use["name"], tool_use["input"]))
+                    continue
+                wait([f for f in outputs if isinstance(f, Future)])
+                outputs.append(self._execute_tool(tool_use["name"], tool_use["input"]))
+
+            tool_results = []
+            for tool_use, output in zip(tool_uses, outputs):
                 tool_results.append({
                     "type": "tool_result",
                     "tool_use_id": tool_use["id"],
-                    "content": result
+                    "content": output.result() if isinstance(output, Future) else output
                 })
 
             # Add tool results to conversation
@@ -669,32 +1443,19 @@ When using tools, wait for results before continuing."""
             })
 
             # Continue conversation
-            request_data["messages"] = self.conversation
+            self._trim_history()
+            mutating_seen = False
 
             try:
-                req = urllib.request.Request(
-                    API_URL,
-                    data=json.dumps(request_data).encode('utf-8'),
-                    headers=headers,
-                    method='POST'
-                )
-
-                with urllib.request.urlopen(req, context=ctx, timeout=120) as response:
-                    response_text = response.read().decode('utf-8')
-
-                response_data = json.loads(response_text)
-                stop_reason = response_data.get("stop_reason")
-                content_blocks = response_data.get("content", [])
+                result = yield from self._exchange(system_prompt, headers, start_tool)
+                if result is None:
+                    return
+                stop_reason, content_blocks = result
 
             except Exception as e:
                 yield f"{Colors.RED}Error: {e}{Colors.RESET}"
                 return
 
-        # Final response
-        for block in content_blocks:
-            if block["type"] == "text":
-                yield block["text"]
-
         # Add final assistant message to conversation
         self.conversation.append({
             "role": "assistant",
@@ -705,6 +1466,64 @@ When using tools, wait for results before continuing."""
 # Interactive CLI
 # =============================================================================
 
+HELP_TEXT = f"""
+{Colors.BOLD}Commands:{Colors.RESET}
+  /quit   - Exit Claude Code G4
+  /clear  - Clear conversation history
+  /login  - Re-authenticate with OAuth
+  /help   - Show this help
+
+{Colors.BOLD}Tips:{Colors.RESET}
+  - Claude can read, write, and edit files
+  - Claude can run bash commands
+  - Claude can search with glob and grep
+  - This is running on PowerPC - be patient!
+"""
+
+# Slash command handlers - each returns True to exit the CLI
+
+def _cmd_quit(client: ClaudeClient) -> bool:
+    print(f"{Colors.CYAN}Goodbye!{Colors.RESET}")
+    return True
+
+def _cmd_clear(client: ClaudeClient) -> bool:
+    client.conversation = []
+    print(f"{Colors.YELLOW}Conversation cleared.{Colors.RESET}")
+    return False
+
+def _cmd_login(client: ClaudeClient) -> bool:
+    print(f"{Colors.YELLOW}Re-authenticating...{Colors.RESET}")
+    new_key = oauth_login()
+    if new_key:
+        # Swap credentials in place - keeps the connection and conversation
+        client.api_key = new_key
+        client.is_oauth = True
+        print(f"{Colors.GREEN}Logged in successfully!{Colors.RESET}")
+    return False
+
+def _cmd_help(client: ClaudeClient) -> bool:
+    print(HELP_TEXT)
+    return False
+
+COMMANDS = {
+    "/quit": _cmd_quit,
+    "/clear": _cmd_clear,
+    "/login": _cmd_login,
+    "/help": _cmd_help,
+}
+
+def _complete_command(text: str, state: int) -> Optional[str]:
+    """readline completer for /commands."""
+    matches = [cmd for cmd in COMMANDS if cmd.startswith(text)] if text.startswith("/") else []
+    return matches[state] if state < len(matches) else None
+
+def _dedupe_history():
+    """Drop the entry just added to readline history if it repeats the previous one."""
+    n = readline.get_current_history_length()
+    if n > 1 and readline.get_history_item(n) == readline.get_history_item(n - 1):
+        readline.remove_history_item(n - 1)
+
+
 def main():
     """Main CLI entry point."""
     print_banner()
@@ -739,14 +1558,24 @@ def main():
     print(f"Use {Colors.BOLD}/login{Colors.RESET} to re-authenticate.")
     print()
 
-    client = ClaudeClient(api_key, is_oauth=is_oauth)
+    client = ClaudeClient(api_key, is_oauth=is_oauth, use_cache="--no-cache" not in sys.argv[1:])
 
-    # Setup readline history
+    # Setup readline history (capped so the file doesn't grow forever)
     history_file = Path.home() / ".claude_code_g4_history"
     try:
         readline.read_history_file(history_file)
     except:
         pass
+    readline.set_history_length(1000)
+    readline.set_auto_history(True)
+
+    # Tab-complete /commands
+    readline.set_completer(_complete_command)
+    readline.set_completer_delims(" \t\n")
+    if "libedit" in (readline.__doc__ or ""):
+        readline.parse_and_bind("bind ^I rl_complete")
+    else:
+        readline.parse_and_bind("tab: complete")
 
     while True:
         try:
@@ -756,36 +1585,15 @@ def main():
             if not user_input:
                 continue
 
-            # Handle commands
-            if user_input.lower() == "/quit":
-                print(f"{Colors.CYAN}Goodbye!{Colors.RESET}")
-                break
-            elif user_input.lower() == "/clear":
-                client.conversation = []
-                print(f"{Colors.YELLOW}Conversation cleared.{Colors.RESET}")
-                continue
-            elif user_input.lower() == "/login":
-                print(f"{Colors.YELLOW}Re-authenticating...{Colors.RESET}")
-                new_key = oauth_login()
-                if new_key:
-                    client = ClaudeClient(new_key, is_oauth=True)
-                    print(f"{Colors.GREEN}Logged in successfully!{Colors.RESET}")
-                continue
-            elif user_input.lower() == "/help":
-                print(f"""
-{Colors.BOLD}Commands:{Colors.RESET}
-  /quit   - Exit Claude Code G4
-  /clear  - Clear conversation history
-  /login  - Re-authenticate with OAuth
-  /help   - Show this help
+            _dedupe_history()
 
-{Colors.BOLD}Tips:{Colors.RESET}
-  - Claude can read, write, and edit files
-  - Claude can run bash commands
-  - Claude can search with glob and grep
-  - This is running on PowerPC - be patient!
-""")
-                continue
+            # Handle commands
+            if user_input.startswith("/"):
+                handler = COMMANDS.get(user_input.split()[0].lower())
+                if handler:
+                    if handler(client):
+                        break
+                    continue
 
             # Send to Claude
             print()
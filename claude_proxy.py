@@ -2,39 +2,656 @@
 """
 Claude Proxy Server
 ====================
-Runs on your main machine, forwards requests from G4 to Claude API
-using your Max subscription OAuth token.
+Runs on your main machine, forwards requests from G4 to Claude using
+your Max subscription.
 
 Usage:
-    python3 claude_proxy.py
+    python3 claude_proxy.py                # MODE=full (the default)
+    MODE=max python3 claude_proxy.py       # same as claude_proxy_max.py
+    MODE=simple python3 claude_proxy.py    # same as claude_proxy_simple.py
 
-The G4 connects to this proxy instead of directly to Anthropic.
+The G4 connects to this proxy instead of directly to Anthropic. MODE
+picks the request handler once, at startup:
+
+full    Requests are answered by a pool of pre-started `claude` processes
+        (one per CPU, at most MAX_CONC) speaking stream-json over
+        stdin/stdout, so Node and Claude Code have already booted when a
+        request arrives. A stream-json process keeps one conversation, so
+        each worker answers exactly one request - no client ever sees
+        another's prompts - and its replacement is started in the
+        background as soon as it is taken from the pool.
+
+        With PROXY_SEMANTIC_CACHE=1 and Ollama running locally, replies
+        are also kept in a small semantic cache: a prompt whose embedding
+        is close enough to one asked recently by the same client is
+        answered from the cache without calling Claude. A near match can
+        still be the wrong answer (and the replies sit in a file on disk),
+        so it is off by default. With the sqlite-vec package installed the
+        distance is computed inside SQLite, otherwise in Python.
+
+max     A complete API-compatible proxy, using full conversation context
+        and tool definitions. If Claude Code's OAuth token is readable
+        from ~/.claude/.credentials.json, requests go straight to
+        api.anthropic.com over a kept-alive HTTPS connection, with the
+        system prompt and tool definitions marked for prompt caching.
+        Otherwise (e.g. the token lives in the macOS Keychain) each request
+        is flattened into one prompt for the `claude` CLI.
+
+simple  The last user message is run through `claude -p`, one process per
+        request.
+
+In every mode at most MAX_CONC (default 4) upstream calls run at once;
+when too many are queued the G4 gets a 503 with Retry-After.
+The listening socket sets SO_REUSEPORT, so on a many-core host several
+copies of the proxy can be started on the same PORT to share the load.
 """
 
+import array
+import hashlib
+import http.client
 import http.server
 import json
+import math
 import os
+import queue
+import socket
+import sqlite3
+import ssl
 import subprocess
-import socketserver
+import sys
+import threading
+import time
+import traceback
+import urllib.request
+from collections import OrderedDict
+from http import HTTPStatus
+from json.encoder import encode_basestring_ascii
 from pathlib import Path
-from urllib.parse import urlparse
+
+# JSON: use a C extension if installed (orjson / ujson), else the stdlib.
+# _dumps returns UTF-8 bytes; _loads accepts str or any bytes-like object.
+# _canonical is a compact, key-sorted _dumps for hashing.
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+
+    def _canonical(obj):
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+except ImportError:
+    try:
+        import ujson
+
+        def _dumps(obj):
+            return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+        def _canonical(obj):
+            return ujson.dumps(obj, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+        def _loads(data):
+            return ujson.loads(data if isinstance(data, str) else str(data, 'utf-8'))
+    except ImportError:
+        def _dumps(obj):
+            return json.dumps(obj).encode('utf-8')
+
+        def _canonical(obj):
+            return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode('utf-8')
+
+        def _loads(data):
+            return json.loads(data if isinstance(data, str) else str(data, 'utf-8'))
 
 PORT = 8765  # Proxy port
+MODE = os.environ.get("MODE", "full")  # full, max or simple; see above
+MAX_CONC = int(os.environ.get("MAX_CONC", "4"))  # Concurrent upstream calls
+MAX_QUEUED = MAX_CONC * 2  # Requests waiting for a slot before we answer 503
+POOL_SIZE = min(os.cpu_count() or 2, MAX_CONC)  # No more workers than the gate lets run
+REQUEST_TIMEOUT = 120  # Per worker turn (full mode)
+WORKER_WAIT = 5  # Seconds to wait for an idle worker before starting one inline
+CLI_TIMEOUT = 300  # Per `claude -p` run or API call (max and simple modes)
+REPLY_CACHE_SIZE = 128  # Replies kept for identical repeated requests
+MAX_HEADERS = 100  # Same limits as http.client
+MAX_HEADER_LINE = 65536
+
+API_HOST = "api.anthropic.com"
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+# Environment for `claude`, built once rather than on every call
+_CLAUDE_ENV = {**os.environ, "NO_COLOR": "1"}
+_SIMPLE_CLAUDE_ENV = {"NO_COLOR": "1", "PATH": "/usr/local/bin:/usr/bin:/bin"}
+
+# Semantic cache
+SEMANTIC_CACHE = os.environ.get("PROXY_SEMANTIC_CACHE", "0") == "1"  # Opt-in; see above
+SEMANTIC_CACHE_DB = Path.home() / ".cache" / "claude-proxy" / "semantic.sqlite3"
+SEMANTIC_CACHE_TTL = 3600  # seconds
+SEMANTIC_CACHE_DISTANCE = 0.1  # cosine distance below which prompts match
+EMBED_URL = os.environ.get("OLLAMA_EMBED_URL", "http://localhost:11434/api/embeddings")
+EMBED_MODEL = "nomic-embed-text"
 
-# Load OAuth token from Claude Code's credentials
+# One TLS context for every API connection, so the CA bundle is loaded once
+_SSL_CTX = ssl.create_default_context()
+
+# Idle keep-alive connections to the API, shared by the handler threads
+_api_pool: "queue.LifoQueue[http.client.HTTPSConnection]" = queue.LifoQueue()
+
+CREDS_FILE = Path.home() / ".claude" / ".credentials.json"
+_TOKEN_CACHE = {"mtime": None, "token": ""}
+
+
+# Load OAuth token from Claude Code's credentials, re-reading only when
+# the file changes (e.g. after Claude Code refreshes the token)
 def get_oauth_token():
-    creds_file = Path.home() / ".claude" / ".credentials.json"
-    if creds_file.exists():
-        creds = json.loads(creds_file.read_text())
-        return creds.get("claudeAiOauth", {}).get("accessToken", "")
-    return ""
+    try:
+        mtime = CREDS_FILE.stat().st_mtime
+    except OSError:
+        return ""
+    if mtime != _TOKEN_CACHE["mtime"]:
+        creds = json.loads(CREDS_FILE.read_bytes())
+        _TOKEN_CACHE.update(
+            mtime=mtime,
+            token=creds.get("claudeAiOauth", {}).get("accessToken", ""))
+    return _TOKEN_CACHE["token"]
+
+
+def with_prompt_caching(data):
+    """Build the upstream request, marking the stable prefix (tools + system)
+    as cacheable so repeated agent turns reuse it."""
+    request = {
+        "model": data.get("model", DEFAULT_MODEL),
+        "max_tokens": data.get("max_tokens", 4096),
+        "messages": data.get("messages", []),
+    }
+    for key in ("stream", "temperature", "stop_sequences", "tool_choice"):
+        if key in data:
+            request[key] = data[key]
+
+    tools = data.get("tools")
+    if tools:
+        tools = [dict(t) for t in tools]
+        tools[-1]["cache_control"] = {"type": "ephemeral"}
+        request["tools"] = tools
+
+    system = data.get("system")
+    if isinstance(system, str) and system:
+        system = [{"type": "text", "text": system}]
+    if system:
+        system = [dict(b) for b in system]
+        system[-1]["cache_control"] = {"type": "ephemeral"}
+        request["system"] = system
+
+    return request
+
+
+class Busy(Exception):
+    """Too many requests are already queued for an upstream call."""
+
+
+class Gate:
+    """Caps concurrent upstream calls at `size`. Up to `max_waiting` more
+    callers queue for a slot; beyond that, entering raises Busy so the
+    client can be told to back off instead of piling up."""
+
+    def __init__(self, size, max_waiting):
+        self.slots = threading.BoundedSemaphore(size)
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        if self.slots.acquire(blocking=False):
+            return self
+        with self.lock:
+            if self.waiting >= self.max_waiting:
+                raise Busy()
+            self.waiting += 1
+        try:
+            self.slots.acquire()
+        finally:
+            with self.lock:
+                self.waiting -= 1
+        return self
+
+    def __exit__(self, *exc):
+        self.slots.release()
+
+
+_gate = Gate(MAX_CONC, MAX_QUEUED)
+
+
+class ClaudeWorker:
+    """A pre-started `claude` process driven with stream-json messages.
+    It answers a single request, then is closed."""
+
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            ["claude", "--print", "--verbose",
+             "--input-format", "stream-json", "--output-format", "stream-json"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=_CLAUDE_ENV
+        )
+
+    def events(self, content):
+        """Send one user turn and yield its stream-json events, up to and
+        including the result message."""
+        message = {"type": "user", "message": {"role": "user", "content": content}}
+        self.proc.stdin.write(_dumps(message) + b"\n")
+        self.proc.stdin.flush()
+
+        # Kill the worker if it stalls; the read loop then sees EOF
+        timer = threading.Timer(REQUEST_TIMEOUT, self.proc.kill)
+        timer.start()
+        try:
+            for line in self.proc.stdout:
+                try:
+                    event = _loads(line)
+                except ValueError:
+                    continue
+                if event.get("type") == "result":
+                    yield event
+                    return
+                yield event
+        finally:
+            timer.cancel()
+
+        # EOF: either the timer killed it or the process died on its own
+        if self.proc.wait() == -9:
+            raise subprocess.TimeoutExpired(self.proc.args, REQUEST_TIMEOUT)
+        raise RuntimeError(f"claude worker exited ({self.proc.returncode})")
+
+    def ask(self, content):
+        """Send one user turn and return the text of its result message.
+        Raises RuntimeError if claude reports the turn as failed."""
+        for event in self.events(content):
+            if event.get("type") == "result":
+                if event.get("is_error"):
+                    raise RuntimeError(event.get("result") or "claude reported an error")
+                return event.get("result", "")
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+# Idle workers, shared by the handler threads
+_workers: "queue.Queue[ClaudeWorker]" = queue.Queue()
+
+
+def _spawn_worker():
+    try:
+        _workers.put(ClaudeWorker())
+    except OSError as e:
+        print(f"[Proxy] Couldn't start a claude worker: {e}")
+
+
+def _take_worker():
+    """An idle worker for one request. Its replacement boots in the
+    background meanwhile, off the request path. If none turns up within
+    WORKER_WAIT (a replacement failed to start), one is started here."""
+    try:
+        worker = _workers.get(timeout=WORKER_WAIT)
+    except queue.Empty:
+        try:
+            worker = ClaudeWorker()
+        except OSError as e:
+            raise RuntimeError(f"Couldn't start a claude worker: {e}") from e
+    threading.Thread(target=_spawn_worker, daemon=True).start()
+    return worker
+
+
+def ask_claude(content):
+    worker = _take_worker()
+    try:
+        return worker.ask(content)
+    finally:
+        worker.close()
+
+
+def assistant_texts(worker, content):
+    """Text of each assistant message in worker's reply, as it arrives."""
+    for event in worker.events(content):
+        if event.get("type") == "result" and event.get("is_error"):
+            # Ends the stream with an error event, so the reply isn't cached
+            raise RuntimeError(event.get("result") or "claude reported an error")
+        if event.get("type") != "assistant":
+            continue
+        for block in event.get("message", {}).get("content", []):
+            if block.get("type") == "text":
+                yield block.get("text", "")
+
+
+def embed(text):
+    """Embedding of text from the local Ollama server, or None if it's unavailable."""
+    request = urllib.request.Request(
+        EMBED_URL,
+        data=_dumps({"model": EMBED_MODEL, "prompt": text}),
+        headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as resp:
+            return _loads(resp.read())["embedding"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _cosine_distance(a, b):
+    """Pure-Python vec_distance_cosine over float32 blobs."""
+    a, b = array.array("f", a), array.array("f", b)
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return 1.0 - dot / norm if norm else 1.0
+
+
+class SemanticCache:
+    """Recent replies, looked up by cosine distance between prompt embeddings."""
+
+    def __init__(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.lock = threading.Lock()
+        try:
+            import sqlite_vec
+            self.db.enable_load_extension(True)
+            sqlite_vec.load(self.db)
+            self.db.enable_load_extension(False)
+        except (ImportError, AttributeError, sqlite3.Error):
+            self.db.create_function("vec_distance_cosine", 2, _cosine_distance)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(client TEXT, embedding BLOB, prompt TEXT, response TEXT, ts INTEGER)")
+        self.db.commit()
+
+    def lookup(self, client, embedding):
+        blob = array.array("f", embedding).tobytes()
+        with self.lock:
+            self.db.execute("DELETE FROM cache WHERE ts < ?",
+                            (int(time.time()) - SEMANTIC_CACHE_TTL,))
+            row = self.db.execute(
+                "SELECT response, vec_distance_cosine(embedding, ?) AS distance "
+                "FROM cache WHERE client = ? ORDER BY distance LIMIT 1",
+                (blob, client)).fetchone()
+        if row and row[1] < SEMANTIC_CACHE_DISTANCE:
+            return row[0]
+        return None
+
+    def store(self, client, embedding, prompt, response):
+        blob = array.array("f", embedding).tobytes()
+        with self.lock:
+            self.db.execute("INSERT INTO cache VALUES (?, ?, ?, ?, ?)",
+                            (client, blob, prompt, response, int(time.time())))
+            self.db.commit()
+
+
+_semantic_cache = None  # Opened by ClaudeProxyHandler.start()
+
+
+class ReplyCache:
+    """Small LRU of replies, keyed on a hash of the canonical request JSON."""
+
+    def __init__(self, size=REPLY_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(data):
+        return hashlib.blake2b(_canonical(data), digest_size=16).digest()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+_reply_cache = ReplyCache()
+
+
+class _Call:
+    """One in-flight request that others may be waiting on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+    def wait(self, timeout):
+        """The leader's reply, or None if it failed or took too long."""
+        self.done.wait(timeout)
+        return self.result
+
+
+class InFlight:
+    """Requests currently being answered, so identical ones that arrive
+    meanwhile wait for that reply instead of making their own call."""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def claim(self, key):
+        """Returns (call, leader). The leader makes the upstream call and
+        must finish() it; everyone else waits on the call."""
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                return call, False
+            call = self.calls[key] = _Call()
+            return call, True
+
+    def finish(self, key, call, result):
+        with self.lock:
+            del self.calls[key]
+        call.result = result
+        call.done.set()
+
+
+_in_flight = InFlight()
+
+
+# Plain-text replies are spliced into this pre-encoded template instead of
+# building a dict and running json.dumps on it for every request. The max
+# and simple handlers close it with their own suffix, naming the model.
+_REPLY_PREFIX = b'{"content":[{"type":"text","text":'
+_REPLY_SUFFIX = b'}],"stop_reason":"end_turn"}'
+
+
+def text_reply_json(text, suffix=_REPLY_SUFFIX):
+    """API-style JSON reply carrying a single text block."""
+    return _REPLY_PREFIX + encode_basestring_ascii(text).encode() + suffix
+
+
+def sse_event(event_type, data):
+    """One server-sent event in the Messages API streaming format."""
+    data = {"type": event_type, **data}
+    return b"event: %s\ndata: %s\n\n" % (event_type.encode(), _dumps(data))
+
+
+def open_api(token, body):
+    """POST to /v1/messages on a pooled connection.
+
+    Returns (conn, response) with the body still unread, so it can be
+    relayed as it arrives; hand both to release_api() once it's consumed.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "anthropic-version": "2023-06-01",
+        "anthropic-beta": "prompt-caching-2024-07-31,oauth-2025-04-20",
+        "Authorization": f"Bearer {token}",
+    }
+    for attempt in (0, 1):
+        try:
+            conn = _api_pool.get_nowait()
+        except queue.Empty:
+            conn = http.client.HTTPSConnection(
+                API_HOST, timeout=CLI_TIMEOUT, context=_SSL_CTX)
+        try:
+            conn.request("POST", "/v1/messages", body, headers)
+            resp = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # Idle connection was closed by the server - retry once on a new one
+            conn.close()
+            if attempt:
+                raise
+            continue
+        except Exception:
+            conn.close()
+            raise
+        return conn, resp
+
+
+def release_api(conn, resp):
+    if resp.isclosed() and not resp.will_close:
+        _api_pool.put(conn)
+    else:
+        conn.close()
+
+
+class ProxyHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP plumbing shared by the mode handlers below; each adds do_POST."""
+
+    # HTTP/1.1, so the G4 can keep one connection open across requests (and
+    # so streamed replies can use chunked encoding). Requests on a connection
+    # are answered strictly one at a time; pipelining is not supported, so
+    # clients must wait for each response before sending the next request.
+    protocol_version = "HTTP/1.1"
+    timeout = 120  # Close keep-alive connections left idle this long
+    # TCP_NODELAY on each connection: without it a small reply can sit in
+    # Nagle's buffer waiting on the G4's delayed ACK for up to 40 ms
+    disable_nagle_algorithm = True
+    reply_suffix = _REPLY_SUFFIX  # Closes text_reply_json
+
+    @classmethod
+    def start(cls):
+        """Prepare the mode (spawn workers, open caches) and print its banner."""
+
+    def setup(self):
+        super().setup()
+        # Request bodies are read into this, reused across keep-alive requests
+        self._buf = bytearray(65536)
+
+    def read_json(self):
+        """Read the request body into the connection's buffer and parse it."""
+        length = int(self.headers.get('Content-Length', 0))
+        if length > len(self._buf):
+            self._buf.extend(bytes(length - len(self._buf)))
+        with memoryview(self._buf) as view:
+            n = self.rfile.readinto(view[:length])
+            return _loads(view[:n])
+
+    def parse_request(self):
+        """Leaner BaseHTTPRequestHandler.parse_request.
+
+        The stock version hands the header block to the email package's
+        feed parser, which is most of its per-request cost. Here each header
+        line is split straight into the HTTPMessage instead, several times
+        faster for the handful of headers the G4 sends. Only HTTP/1.x
+        request lines are accepted, and folded header lines are not.
+        """
+        self.close_connection = True
+        self.request_version = self.default_request_version
+        requestline = str(self.raw_requestline, 'iso-8859-1').rstrip('\r\n')
+        self.requestline = requestline
+
+        words = requestline.split()
+        if len(words) != 3 or not words[2].startswith("HTTP/1."):
+            self.send_error(HTTPStatus.BAD_REQUEST, f"Bad request syntax ({requestline!r})")
+            return False
+        self.command, self.path, self.request_version = words
+        if self.request_version >= "HTTP/1.1" and self.protocol_version >= "HTTP/1.1":
+            self.close_connection = False
+
+        headers = self.headers = self.MessageClass()
+        for _ in range(MAX_HEADERS):
+            line = self.rfile.readline(MAX_HEADER_LINE + 1)
+            if len(line) > MAX_HEADER_LINE:
+                self.send_error(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Line too long")
+                return False
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, sep, value = line.decode('iso-8859-1').partition(":")
+            if not sep:
+                self.send_error(HTTPStatus.BAD_REQUEST, "Bad header line")
+                return False
+            headers[name.strip()] = value.strip()
+        else:
+            self.send_error(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+            return False
+
+        conntype = headers.get("Connection", "").lower()
+        if conntype == "close":
+            self.close_connection = True
+        elif conntype == "keep-alive" and self.protocol_version >= "HTTP/1.1":
+            self.close_connection = False
+        if (headers.get("Expect", "").lower() == "100-continue"
+                and self.request_version >= "HTTP/1.1"
+                and self.protocol_version >= "HTTP/1.1"):
+            return self.handle_expect_100()
+        return True
+
+    def send_busy(self):
+        """503 with Retry-After, so the G4 backs off and tries again."""
+        print("[Proxy] Too many queued requests, sending 503")
+        self.close_connection = True
+        self.send_response(503)
+        self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send_payload(self, status, content_type, payload):
+        """Send status line, headers and body with a single write, so a small
+        reply goes out as one packet instead of a header write then a body write."""
+        self.log_request(status)
+        reason = self.responses.get(status, ("",))[0]
+        self.wfile.write(
+            b"%s %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n"
+            b"Connection: %s\r\n\r\n%s" % (
+                self.protocol_version.encode(), status, reason.encode(),
+                content_type.encode(), len(payload),
+                b"close" if self.close_connection else b"keep-alive", payload))
+
+    def send_reply(self, response_text):
+        # Format response like the API would
+        self.send_payload(200, "application/json",
+                          text_reply_json(response_text, self.reply_suffix))
 
-class ClaudeProxyHandler(http.server.BaseHTTPRequestHandler):
-    def do_POST(self):
-        # Read the request body
-        content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length)
 
+class ClaudeProxyHandler(ProxyHandler):
+    """full mode: a pool of stream-json `claude` workers, plus the semantic cache."""
+
+    @classmethod
+    def start(cls):
+        try:
+            for _ in range(POOL_SIZE):
+                _workers.put(ClaudeWorker())
+        except FileNotFoundError:
+            print("ERROR: 'claude' command not found!")
+            print("Install Claude Code CLI first: npm install -g @anthropic/claude-code")
+            sys.exit(1)
+
+        global _semantic_cache
+        if SEMANTIC_CACHE:
+            _semantic_cache = SemanticCache(SEMANTIC_CACHE_DB)
+
+        print(f"""
+╔═══════════════════════════════════════════════════════════╗
+║            Claude Proxy Server for G4                      ║
+╚═══════════════════════════════════════════════════════════╝
+
+Listening on port {PORT} ({POOL_SIZE} claude workers)
+G4 should connect to: http://192.168.0.XXX:{PORT}/v1/messages
+
+Press Ctrl+C to stop.
+""")
+
+    def do_POST(self):
         print(f"[Proxy] Received request from {self.client_address[0]}")
 
         # Get OAuth token
@@ -47,7 +664,7 @@ class ClaudeProxyHandler(http.server.BaseHTTPRequestHandler):
         try:
             # Use the actual Claude Code CLI to make the request
             # This ensures we use the same auth mechanism
-            request_data = json.loads(body)
+            request_data = self.read_json()
 
             # Extract the user message
             messages = request_data.get("messages", [])
@@ -56,58 +673,475 @@ class ClaudeProxyHandler(http.server.BaseHTTPRequestHandler):
                 return
 
             user_message = messages[-1].get("content", "")
+            stream = request_data.get("stream")
 
-            # Call Claude Code in print mode
-            result = subprocess.run(
-                ["claude", "-p", user_message],
-                capture_output=True,
-                text=True,
-                timeout=120,
-                env={**os.environ, "NO_COLOR": "1"}
-            )
-
-            # Format response like the API would
-            response = {
-                "content": [{"type": "text", "text": result.stdout}],
-                "stop_reason": "end_turn"
-            }
-
-            response_json = json.dumps(response)
+            # Identical requests (retries, test loops) get the same reply
+            key = ReplyCache.key(request_data)
+            cached = _reply_cache.get(key)
+            if cached is not None:
+                print("[Proxy] Reply cache hit")
+                self.send_text(cached, stream)
+                return
 
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Content-Length", len(response_json))
-            self.end_headers()
-            self.wfile.write(response_json.encode())
+            # ...and so do identical requests that arrive while it's in flight
+            call, leader = _in_flight.claim(key)
+            if not leader:
+                shared = call.wait(REQUEST_TIMEOUT)
+                if shared is not None:
+                    print("[Proxy] Shared an in-flight reply")
+                    self.send_text(shared, stream)
+                    return
 
-            print(f"[Proxy] Response sent ({len(result.stdout)} chars)")
+            response_text = None
+            try:
+                response_text = self.answer(user_message, stream)
+            finally:
+                if leader:
+                    _in_flight.finish(key, call, response_text)
+            if response_text:
+                _reply_cache.put(key, response_text)
 
+        except Busy:
+            self.send_busy()
         except subprocess.TimeoutExpired:
             self.send_error(504, "Claude request timed out")
         except Exception as e:
             print(f"[Proxy] Error: {e}")
             self.send_error(500, str(e))
 
+    def answer(self, user_message, stream):
+        """Reply to user_message from the semantic cache or a worker.
+        Returns the reply text, or None if it didn't complete."""
+        # Answer near-duplicates of recent prompts from the cache
+        client = self.client_address[0]
+        embedding = None
+        if _semantic_cache and isinstance(user_message, str):
+            embedding = embed(user_message)
+        if embedding:
+            cached = _semantic_cache.lookup(client, embedding)
+            if cached is not None:
+                print("[Proxy] Semantic cache hit")
+                self.send_text(cached, stream)
+                return cached
+
+        with _gate:
+            if stream:
+                # Taken before the 200 goes out, so a failure can still be a 500
+                worker = _take_worker()
+                try:
+                    response_text = self.stream_reply(assistant_texts(worker, user_message))
+                finally:
+                    worker.close()
+            else:
+                # Hand the message to an idle Claude Code worker
+                response_text = ask_claude(user_message)
+                self.send_reply(response_text)
+
+        if embedding and response_text:
+            _semantic_cache.store(client, embedding, user_message, response_text)
+        return response_text
+
+    def send_text(self, text, stream):
+        """Send an already-known reply, streamed or not as the client asked."""
+        if stream:
+            self.stream_reply([text])
+        else:
+            self.send_reply(text)
+
+    def send_reply(self, response_text):
+        super().send_reply(response_text)
+        print(f"[Proxy] Response sent ({len(response_text)} chars)")
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def stream_reply(self, texts):
+        """Send texts as SSE, one text block each, as they are produced, so
+        the G4 can print a worker's reply while Claude is still working.
+        Returns the full text, or None if the reply didn't complete."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        parts = []
+        try:
+            self.write_chunk(sse_event("message_start", {"message": {
+                "role": "assistant", "content": [], "model": "claude-via-proxy"}}))
+            try:
+                for index, text in enumerate(texts):
+                    if index:
+                        text = "\n\n" + text
+                    self.write_chunk(
+                        sse_event("content_block_start", {"index": index,
+                                  "content_block": {"type": "text", "text": ""}})
+                        + sse_event("content_block_delta", {"index": index,
+                                    "delta": {"type": "text_delta", "text": text}})
+                        + sse_event("content_block_stop", {"index": index}))
+                    parts.append(text)
+                self.write_chunk(
+                    sse_event("message_delta", {"delta": {"stop_reason": "end_turn"}})
+                    + sse_event("message_stop", {}))
+            except (subprocess.TimeoutExpired, RuntimeError) as e:
+                print(f"[Proxy] Error: {e}")
+                self.write_chunk(sse_event("error", {"error": {
+                    "type": "api_error", "message": str(e)}}))
+                parts = None
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError as e:
+            print(f"[Proxy] Client went away: {e}")
+            self.close_connection = True
+            return None
+
+        if parts is None:
+            return None
+        response_text = "".join(parts)
+        print(f"[Proxy] Response streamed ({len(response_text)} chars)")
+        return response_text
+
     def log_message(self, format, *args):
         print(f"[Proxy] {args[0]}")
 
-def main():
-    print(f"""
+
+class ClaudeMaxProxyHandler(ProxyHandler):
+    """max mode: straight to the API with prompt caching, else `claude -p`."""
+
+    reply_suffix = b'}],"stop_reason":"end_turn","model":"claude-via-max-proxy"}'
+
+    @classmethod
+    def start(cls):
+        # Check if claude CLI is available
+        try:
+            result = subprocess.run(["claude", "--version"], capture_output=True, text=True)
+            version = result.stdout.strip() if result.stdout else "unknown"
+            print(f"Claude CLI: {version}")
+        except FileNotFoundError:
+            if not get_oauth_token():
+                print("ERROR: 'claude' command not found!")
+                print("Install Claude Code CLI first: npm install -g @anthropic/claude-code")
+                sys.exit(1)
+            print("Claude CLI: not found (using direct API access)")
+
+        print(f"""
 ╔═══════════════════════════════════════════════════════════╗
-║            Claude Proxy Server for G4                      ║
+║       Claude Max Subscription Proxy for G4                ║
 ╚═══════════════════════════════════════════════════════════╝
 
-Listening on port {PORT}
-G4 should connect to: http://192.168.0.XXX:{PORT}/v1/messages
+Listening on: http://0.0.0.0:{PORT}
+
+On the G4, run:
+  export CLAUDE_PROXY="http://YOUR_IP:{PORT}/v1/messages"
+  ./qjs --std claude_code.js
+
+Press Ctrl+C to stop.
+""")
+
+    def do_POST(self):
+        try:
+            data = self.read_json()
+
+            # Identical requests (retries, test loops) get the same reply
+            key = ReplyCache.key(data)
+            cached = _reply_cache.get(key)
+            if cached is not None:
+                print("[Proxy] Reply cache hit")
+                self.send_payload(200, *cached)
+                return
+
+            # ...and so do identical requests that arrive while it's in flight
+            call, leader = _in_flight.claim(key)
+            if not leader:
+                shared = call.wait(CLI_TIMEOUT)
+                if shared is not None:
+                    print("[Proxy] Shared an in-flight reply")
+                    self.send_payload(200, *shared)
+                    return
+
+            reply = None
+            try:
+                token = get_oauth_token()
+                with _gate:
+                    if token:
+                        reply = self.forward_to_api(token, data)
+                    else:
+                        reply = self.run_cli(data)
+            finally:
+                if leader:
+                    _in_flight.finish(key, call, reply)
+            if reply is not None:
+                _reply_cache.put(key, reply)
+
+        except Busy:
+            self.send_busy()
+        except subprocess.TimeoutExpired:
+            self.send_error(504, "Request timeout")
+        except Exception as e:
+            print(f"[Proxy] Error: {e}")
+            traceback.print_exc()
+            self.send_error(500, str(e))
+
+    def forward_to_api(self, token, data):
+        """Send the request directly to the API and relay its reply unchanged.
+
+        Returns (content type, body) of a successful reply, for caching.
+        """
+        request_json = _dumps(with_prompt_caching(data))
+        print(f"[Proxy] Forwarding to API ({len(request_json)} bytes)...")
+
+        conn, resp = open_api(token, request_json)
+        try:
+            content_type = resp.getheader("Content-Type", "application/json")
+            if content_type.startswith("text/event-stream"):
+                payload = self.relay_stream(resp)
+            else:
+                payload = resp.read()
+                self.send_payload(resp.status, content_type, payload)
+                print(f"[Proxy] API response: {resp.status} ({len(payload)} bytes)")
+            if payload is not None and resp.status == 200:
+                return content_type, payload
+            return None
+        finally:
+            release_api(conn, resp)
+
+    def relay_stream(self, resp):
+        """Pass the upstream SSE bytes through as they arrive, re-framed as
+        chunks for the G4. Returns the whole stream, or None if it broke off."""
+        self.send_response(resp.status)
+        self.send_header("Content-Type", resp.getheader("Content-Type"))
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        chunks = []
+        try:
+            while True:
+                chunk = resp.read1(65536)
+                if not chunk:
+                    break
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                chunks.append(chunk)
+            self.wfile.write(b"0\r\n\r\n")
+        except (OSError, http.client.HTTPException) as e:
+            # Headers are already out, so all we can do is drop the connection
+            print(f"[Proxy] Stream interrupted: {e}")
+            self.close_connection = True
+            return None
+
+        payload = b"".join(chunks)
+        print(f"[Proxy] API stream: {resp.status} ({len(payload)} bytes)")
+        return payload
+
+    def run_cli(self, data):
+        """Fallback: flatten the conversation into one prompt for `claude -p`.
+
+        Returns (content type, body) for caching, or None if claude failed.
+        """
+        # Extract the full request
+        messages = data.get("messages", [])
+        system = data.get("system", "")
+        tools = data.get("tools", [])
+
+        # Build the prompt as one list of fragments, joined once at the end
+        parts = []
+        append = parts.append
+
+        if system:
+            append("<system>\n")
+            append(system)
+            append("\n</system>\n")
+
+        if tools:
+            if parts:
+                append("\n")
+            append("<available_tools>")
+            append(", ".join(t.get("name", "unknown") for t in tools))
+            append("</available_tools>\n")
+
+        # Add message history, one blank line between sections
+        for msg in messages:
+            role = msg.get("role", "user")
+            content = msg.get("content", "")
+
+            if parts:
+                append("\n")
+            append("<")
+            append(role)
+            append(">\n")
+
+            if isinstance(content, list):
+                # Handle content blocks (tool results, etc.), one per line
+                sep = ""
+                for block in content:
+                    if isinstance(block, dict):
+                        block_type = block.get("type")
+                        if block_type == "text":
+                            append(sep)
+                            append(block.get("text", ""))
+                        elif block_type == "tool_result":
+                            append(sep)
+                            append("[Tool Result: ")
+                            append(str(block.get("content", "")))
+                            append("]")
+                        elif block_type == "tool_use":
+                            append(sep)
+                            append("[Tool Call: ")
+                            append(block.get("name", ""))
+                            append("(")
+                            append(json.dumps(block.get("input", {})))
+                            append(")]")
+                        else:
+                            continue
+                    else:
+                        append(sep)
+                        append(str(block))
+                    sep = "\n"
+            else:
+                append(str(content))
+
+            append("\n</")
+            append(role)
+            append(">\n")
+
+        full_prompt = "".join(parts)
+
+        print(f"[Proxy] Processing request ({len(full_prompt)} chars)...")
+
+        # Call claude CLI with the prompt piped to stdin
+        # Using --output-format json for structured response
+        # Output stays bytes; it's only decoded if it has to be wrapped
+        result = subprocess.run(
+            ["claude", "-p", "--output-format", "json"],
+            input=full_prompt.encode('utf-8'),
+            capture_output=True,
+            timeout=CLI_TIMEOUT,
+            env=_CLAUDE_ENV
+        )
+
+        response_bytes = result.stdout.strip() if result.stdout else result.stderr
+
+        # Try to parse as JSON first
+        try:
+            parsed = _loads(response_bytes)
+        except ValueError:
+            parsed = None
+
+        if isinstance(parsed, dict) and "content" in parsed:
+            # Already structured, pass it through
+            response_json = response_bytes
+        else:
+            # Wrap text response
+            response_json = text_reply_json(response_bytes.decode('utf-8', 'replace'),
+                                            self.reply_suffix)
+
+        self.send_payload(200, "application/json", response_json)
+
+        print(f"[Proxy] Response: {len(response_bytes)} bytes")
+        if result.returncode != 0:
+            # Relayed, but not cached: an identical retry should run again
+            print(f"[Proxy] claude exited with {result.returncode}")
+            return None
+        return "application/json", response_json
+
+    def log_message(self, format, *args):
+        pass  # Suppress default logging
+
+
+class SimpleProxyHandler(ProxyHandler):
+    """simple mode: the last user message through `claude -p`, one run per request."""
+
+    reply_suffix = b'}],"stop_reason":"end_turn","model":"claude-via-proxy"}'
+
+    @classmethod
+    def start(cls):
+        print(f"""
+╔═══════════════════════════════════════════════════════════╗
+║         Claude Proxy for G4 (Max Subscription)            ║
+╚═══════════════════════════════════════════════════════════╝
+
+Listening on: http://0.0.0.0:{PORT}
+
+On G4, set: API_URL = "http://192.168.0.XXX:{PORT}/v1/messages"
 
 Press Ctrl+C to stop.
 """)
 
-    with socketserver.TCPServer(("0.0.0.0", PORT), ClaudeProxyHandler) as httpd:
+    def do_POST(self):
+        try:
+            data = self.read_json()
+            messages = data.get("messages", [])
+
+            # Get the last user message
+            user_msg = ""
+            for msg in messages:
+                if msg.get("role") == "user":
+                    user_msg = msg.get("content", "")
+
+            if not user_msg:
+                self.send_error(400, "No user message")
+                return
+
+            print(f"[Proxy] Request: {user_msg[:50]}...")
+
+            # Call claude -p (output read as bytes and decoded once)
+            with _gate:
+                result = subprocess.run(
+                    ["claude", "-p", user_msg],
+                    capture_output=True,
+                    timeout=CLI_TIMEOUT,
+                    env=_SIMPLE_CLAUDE_ENV
+                )
+
+            response_text = (result.stdout or result.stderr).decode('utf-8', 'replace')
+
+            # Format as API response
+            self.send_reply(response_text)
+
+            print(f"[Proxy] Response: {len(response_text)} chars")
+
+        except Busy:
+            self.send_busy()
+        except subprocess.TimeoutExpired:
+            self.send_error(504, "Timeout")
+        except Exception as e:
+            print(f"[Proxy] Error: {e}")
+            self.send_error(500, str(e))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ProxyServer(http.server.ThreadingHTTPServer):
+    """One thread per request, so a slow `claude` call doesn't block other
+    clients. SO_REUSEPORT lets several proxy processes share PORT, with the
+    kernel spreading connections between them."""
+
+    def server_bind(self):
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+HANDLERS = {
+    "full": ClaudeProxyHandler,
+    "max": ClaudeMaxProxyHandler,
+    "simple": SimpleProxyHandler,
+}
+
+
+def main(mode=None):
+    """Serve in the given mode (default: $MODE, else full)."""
+    mode = mode or MODE
+    handler = HANDLERS.get(mode)
+    if handler is None:
+        print(f"ERROR: unknown MODE {mode!r} (expected one of: {', '.join(HANDLERS)})")
+        sys.exit(1)
+    handler.start()
+
+    with ProxyServer(("0.0.0.0", PORT), handler) as httpd:
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n[Proxy] Shutting down...")
 
+
 if __name__ == "__main__":
     main()
@@ -10,8 +10,68 @@ import * as os from 'os';
 const PYTHON_PATH = '/opt/local/bin/python3.10';
 const HTTP_HELPER = '/Users/sophia/claude-code-g4/http_helper.py';
 
+// Long-lived helper process (http_helper.py --stdio), spoken to with one
+// JSON line per request so its keep-alive connections survive between calls
+let helper = null;
+
+function startHelper() {
+    // Don't let a dead helper's pipe kill us with SIGPIPE
+    os.signal(os.SIGPIPE, undefined);
+
+    const toHelper = os.pipe();
+    const fromHelper = os.pipe();
+    const pid = os.exec([PYTHON_PATH, HTTP_HELPER, '--stdio'], {
+        block: false,
+        stdin: toHelper[0],
+        stdout: fromHelper[1]
+    });
+    os.close(toHelper[0]);
+    os.close(fromHelper[1]);
+    if (pid < 0) {
+        os.close(toHelper[1]);
+        os.close(fromHelper[0]);
+        return null;
+    }
+    return {
+        pid: pid,
+        input: std.fdopen(toHelper[1], 'w'),
+        output: std.fdopen(fromHelper[0], 'r')
+    };
+}
+
+function stopHelper() {
+    helper.input.close();
+    helper.output.close();
+    os.waitpid(helper.pid, 0);
+    helper = null;
+}
+
+/**
+ * Send a request to the long-lived helper, restarting it once if it has
+ * died; falls back to a one-shot helper run if it can't be started
+ */
+function callHelper(requestJson) {
+    for (let attempt = 0; attempt < 2; attempt++) {
+        if (!helper) helper = startHelper();
+        if (!helper) break;
+
+        helper.input.puts(requestJson + '\n');
+        helper.input.flush();
+        const line = helper.output.getline();
+        if (line !== null) {
+            try {
+                return JSON.parse(line);
+            } catch (e) {
+                return { ok: false, error: 'Failed to parse response: ' + line };
+            }
+        }
+        stopHelper();
+    }
+    return callPython(requestJson);
+}
+
 /**
- * Execute Python HTTP helper and parse result
+ * Execute Python HTTP helper once and parse result
  */
 function callPython(requestJson) {
     // Write request to temp file (avoid shell escaping issues)
@@ -55,7 +115,7 @@ export function request(method, url, options = {}) {
         headers: options.headers || {},
         body: options.body || null
     };
-    return callPython(JSON.stringify(req));
+    return callHelper(JSON.stringify(req));
 }
 
 /**
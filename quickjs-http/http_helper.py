@@ -2,45 +2,103 @@
 """
 HTTP Helper for QuickJS on Tiger/Leopard
 Uses Python 3.10's OpenSSL for TLS 1.2/1.3 support
-Called via os.exec from QuickJS
+
+One-shot (called via popen from QuickJS):
+    http_helper.py '<json_request>'
+    http_helper.py - < request.json
+
+Long-lived (spawned once via os.exec with pipes):
+    http_helper.py --stdio
+reads one JSON request per line on stdin and writes one JSON response per
+line on stdout. Connections are kept alive between requests, so chatty
+sessions pay for the TLS handshake once per host instead of once per call.
 """
 import sys
 import json
-import urllib.request
-import urllib.error
+import http.client
 import ssl
+from urllib.parse import urlsplit
+
+# JSON: use a C extension if installed (orjson / ujson), else the stdlib.
+# _dumps returns UTF-8 bytes; _loads accepts bytes or str.
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+
+        def _dumps(obj):
+            return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+        _loads = ujson.loads
+    except ImportError:
+        def _dumps(obj):
+            return json.dumps(obj).encode('utf-8')
+        _loads = json.loads
+
+# SSL context with modern TLS, created once: loading the CA bundle is slow
+# on the G4
+_SSL_CTX = ssl.create_default_context()
+_SSL_CTX.check_hostname = True
+_SSL_CTX.verify_mode = ssl.CERT_REQUIRED
+
+# Idle keep-alive connections, by (scheme, host, port)
+_connections = {}
+
+
+def _new_connection(scheme, host, port):
+    if scheme == "https":
+        return http.client.HTTPSConnection(host, port, context=_SSL_CTX, timeout=120)
+    return http.client.HTTPConnection(host, port, timeout=120)
+
 
 def make_request(method, url, headers=None, body=None):
     """Make HTTP request and return JSON response."""
     headers = headers or {}
 
-    # Create SSL context with modern TLS
-    ctx = ssl.create_default_context()
-    ctx.check_hostname = True
-    ctx.verify_mode = ssl.CERT_REQUIRED
-
-    # Build request
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.hostname, parts.port)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
     data = body.encode('utf-8') if body else None
-    req = urllib.request.Request(url, data=data, method=method)
-
-    for key, value in headers.items():
-        req.add_header(key, value)
 
     try:
-        with urllib.request.urlopen(req, context=ctx, timeout=120) as resp:
-            response_body = resp.read().decode('utf-8')
+        for attempt in (0, 1):
+            conn = _connections.pop(key, None) or _new_connection(*key)
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                resp = conn.getresponse()
+                response_body = resp.read().decode('utf-8')
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Idle connection was closed by the server - retry once on a new one
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                _connections[key] = conn
+            break
+
+        if resp.status >= 400:
             return {
-                "ok": True,
+                "ok": False,
                 "status": resp.status,
-                "headers": dict(resp.headers),
+                "error": f"HTTP Error {resp.status}: {resp.reason}",
                 "body": response_body
             }
-    except urllib.error.HTTPError as e:
         return {
-            "ok": False,
-            "status": e.code,
-            "error": str(e),
-            "body": e.read().decode('utf-8') if e.fp else ""
+            "ok": True,
+            "status": resp.status,
+            "headers": dict(resp.headers),
+            "body": response_body
         }
     except Exception as e:
         return {
@@ -50,11 +108,42 @@ def make_request(method, url, headers=None, body=None):
             "body": ""
         }
 
+
+def handle(req):
+    """Run one decoded request and return the result dict."""
+    method = req.get("method", "GET")
+    url = req.get("url", "")
+    headers = req.get("headers", {})
+    body = req.get("body", None)
+
+    return make_request(method, url, headers, body)
+
+
+def serve_stdio():
+    """Answer newline-delimited JSON requests until stdin closes."""
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        try:
+            result = handle(_loads(line))
+        except ValueError as e:
+            result = {"ok": False, "error": f"Invalid JSON: {e}"}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        # JSON escapes newlines, so each response is exactly one line
+        sys.stdout.buffer.write(_dumps(result) + b"\n")
+        sys.stdout.buffer.flush()
+
+
 def main():
     if len(sys.argv) < 2:
-        print(json.dumps({"ok": False, "error": "Usage: http_helper.py <json_request>"}))
+        print(json.dumps({"ok": False, "error": "Usage: http_helper.py <json_request> | - | --stdio"}))
         sys.exit(1)
 
+    if sys.argv[1] == "--stdio":
+        serve_stdio()
+        return
+
     try:
         # Read request from stdin if arg is "-"
         if sys.argv[1] == "-":
@@ -62,16 +151,10 @@ def main():
         else:
             request_json = sys.argv[1]
 
-        req = json.loads(request_json)
-        method = req.get("method", "GET")
-        url = req.get("url", "")
-        headers = req.get("headers", {})
-        body = req.get("body", None)
-
-        result = make_request(method, url, headers, body)
-        print(json.dumps(result))
+        result = handle(_loads(request_json))
+        sys.stdout.buffer.write(_dumps(result) + b"\n")
 
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         print(json.dumps({"ok": False, "error": f"Invalid JSON: {e}"}))
         sys.exit(1)
     except Exception as e:
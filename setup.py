@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Build the optional _ccg4_native C helpers used by claude_code_g4.py.
+
+Usage (builds _ccg4_native.so next to claude_code_g4.py):
+    python3 setup.py build_ext --inplace
+
+On Tiger/Leopard with MacPorts Python, tune for the G4:
+    CFLAGS="-O2 -mcpu=7450 -maltivec" /opt/local/bin/python3.10 setup.py build_ext --inplace
+
+claude_code_g4.py works without it - the pure-Python paths are used instead.
+"""
+
+try:
+    from setuptools import setup, Extension
+except ImportError:
+    from distutils.core import setup, Extension
+
+setup(
+    name="claude-code-g4-native",
+    version="0.1.0",
+    description="Optional C helpers for Claude Code G4",
+    ext_modules=[Extension("_ccg4_native", ["_ccg4_native.c"])],
+)